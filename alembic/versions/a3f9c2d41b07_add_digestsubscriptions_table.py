@@ -0,0 +1,36 @@
+"""Add digestSubscriptions table
+
+Revision ID: a3f9c2d41b07
+Revises: 1706c6bb2277
+Create Date: 2024-11-04 21:12:40.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f9c2d41b07'
+down_revision: Union[str, None] = '1706c6bb2277'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('digestSubscriptions',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('delivery_time', sa.Time(), nullable=False),
+    sa.Column('timezone', sa.String(), nullable=False),
+    sa.Column('last_sent_on', sa.Date(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('id'),
+    sa.UniqueConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('digestSubscriptions')
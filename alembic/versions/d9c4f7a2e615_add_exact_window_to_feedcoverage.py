@@ -0,0 +1,32 @@
+"""Add exact window to feedCoverage
+
+Revision ID: d9c4f7a2e615
+Revises: b5d2e8f41c73
+Create Date: 2024-11-20 19:42:16.204815
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9c4f7a2e615'
+down_revision: Union[str, None] = 'b5d2e8f41c73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('feedCoverage', sa.Column('covered_from', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('feedCoverage', sa.Column('covered_to', sa.DateTime(timezone=True), nullable=True))
+    # Rows so far were after:/before: searches, covering midnight to midnight (UTC)
+    op.execute("""UPDATE "feedCoverage" SET covered_from = range_from::timestamp AT TIME ZONE 'UTC', covered_to = range_to::timestamp AT TIME ZONE 'UTC'""")
+    op.alter_column('feedCoverage', 'covered_from', nullable=False)
+    op.alter_column('feedCoverage', 'covered_to', nullable=False)
+
+
+def downgrade() -> None:
+    op.drop_column('feedCoverage', 'covered_to')
+    op.drop_column('feedCoverage', 'covered_from')
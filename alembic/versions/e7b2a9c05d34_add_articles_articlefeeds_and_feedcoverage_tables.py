@@ -0,0 +1,63 @@
+"""Add articles, articleFeeds and feedCoverage tables
+
+Revision ID: e7b2a9c05d34
+Revises: c41d7e9a2f15
+Create Date: 2024-11-12 20:05:37.913021
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b2a9c05d34'
+down_revision: Union[str, None] = 'c41d7e9a2f15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('articles',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('url_hash', sa.String(length=32), nullable=False),
+    sa.Column('link', sa.String(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('publisher', sa.String(), nullable=True),
+    sa.Column('published_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('summary', sa.String(), nullable=True),
+    sa.Column('first_seen_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('id'),
+    sa.UniqueConstraint('url_hash')
+    )
+    op.create_index(op.f('ix_articles_published_at'), 'articles', ['published_at'], unique=False)
+    op.create_table('articleFeeds',
+    sa.Column('article_id', sa.UUID(), nullable=False),
+    sa.Column('feed_key', sa.String(), nullable=False),
+    sa.Column('seen_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['article_id'], ['articles.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('article_id', 'feed_key')
+    )
+    op.create_index('ix_articleFeeds_feed_key', 'articleFeeds', ['feed_key'], unique=False)
+    op.create_table('feedCoverage',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('feed_key', sa.String(), nullable=False),
+    sa.Column('range_from', sa.Date(), nullable=False),
+    sa.Column('range_to', sa.Date(), nullable=False),
+    sa.Column('article_count', sa.Integer(), nullable=False),
+    sa.Column('fetched_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('id')
+    )
+    op.create_index(op.f('ix_feedCoverage_feed_key'), 'feedCoverage', ['feed_key'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_feedCoverage_feed_key'), table_name='feedCoverage')
+    op.drop_table('feedCoverage')
+    op.drop_index('ix_articleFeeds_feed_key', table_name='articleFeeds')
+    op.drop_table('articleFeeds')
+    op.drop_index(op.f('ix_articles_published_at'), table_name='articles')
+    op.drop_table('articles')
@@ -0,0 +1,31 @@
+"""Add full-text search to articles
+
+Revision ID: f3a8d1c6b920
+Revises: e7b2a9c05d34
+Create Date: 2024-11-15 22:31:08.640193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a8d1c6b920'
+down_revision: Union[str, None] = 'e7b2a9c05d34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('articles', sa.Column('publisher_url', sa.String(), nullable=True))
+    op.add_column('articles', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed("to_tsvector('english', title || ' ' || coalesce(publisher, ''))", persisted=True), nullable=True))
+    op.create_index('ix_articles_search_vector', 'articles', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_articles_search_vector', table_name='articles', postgresql_using='gin')
+    op.drop_column('articles', 'search_vector')
+    op.drop_column('articles', 'publisher_url')
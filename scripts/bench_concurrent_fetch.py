@@ -0,0 +1,82 @@
+"""
+Latency seen by concurrent users fetching feeds, against a mock Google News answering after a fixed delay.
+"before" fetches the way GoogleNews did before it was async: a blocking call made straight from the handler,
+"after" goes through the async GoogleNews and its shared client.
+Run from the repository root with: PYTHONPATH=. python scripts/bench_concurrent_fetch.py [users] [upstream delay in ms]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+# The fetch path imports the database settings, nothing connects
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://bench@localhost/bench")
+# Measure the client, not the per-host request budget
+os.environ.setdefault("RATE_LIMITS", "news.google.com=10000:10000")
+
+ITEM = ("<item><title>Story {i} about something that happened today - Publisher</title><link>https://example.com/{i}</link>"
+        "<pubDate>Mon, 18 Nov 2024 10:00:00 GMT</pubDate><source url=\"https://example.com\">Publisher</source></item>")
+RSS = ("<?xml version=\"1.0\" encoding=\"UTF-8\"?><rss version=\"2.0\"><channel><title>Mock</title>"
+       + "".join(ITEM.format(i=i) for i in range(50)) + "</channel></rss>").encode()
+
+
+def summary(label: str, latencies: list, wall: float):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{label:<7} wall {wall * 1000:7.0f} ms  median {statistics.median(latencies) * 1000:7.0f} ms  "
+          f"p95 {p95 * 1000:7.0f} ms  max {latencies[-1] * 1000:7.0f} ms")
+
+
+async def before(users: int, delay: float):
+    from src.utils import rss_parser
+
+    def handler(request):
+        time.sleep(delay)
+        return httpx.Response(200, content=RSS)
+
+    async def user(i, started):
+        # A fresh blocking client per call, like requests.get without a session
+        with httpx.Client(transport=httpx.MockTransport(handler)) as client:
+            rss_parser.parse_feed(client.get(f"https://news.google.com/rss/search?q=user{i}").content)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(user(i, started) for i in range(users)))
+    summary("before", latencies, time.perf_counter() - started)
+
+
+async def after(users: int, delay: float):
+    from src.pygooglenews import GoogleNews, _http_clients, close_http_clients
+
+    async def handler(request):
+        await asyncio.sleep(delay)
+        return httpx.Response(200, content=RSS)
+
+    # The direct egress path uses the shared client registered for proxy None
+    _http_clients[None] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    gn = GoogleNews()
+
+    async def user(i, started):
+        # A different query per user, so neither the feed cache nor request coalescing can answer it
+        await gn.search(f"user{i}")
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(user(i, started) for i in range(users)))
+    summary("after", latencies, time.perf_counter() - started)
+    await close_http_clients()
+
+
+async def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    delay = (float(sys.argv[2]) if len(sys.argv) > 2 else 200) / 1000
+    print(f"{users} concurrent users, upstream answering in {delay * 1000:.0f} ms")
+    await before(users, delay)
+    await after(users, delay)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+"""
+Sending one document to many chats by upload each time against FileIdStore's file_id reuse, through PTB's Bot pointed at
+a local Bot API stand-in. The stand-in can delay uploads by size / bandwidth to model a slow uplink, and forget its files
+to check that a stale file_id is uploaded again.
+Run from the repository root with: PYTHONPATH=. python scripts/bench_file_id.py [sends]
+"""
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+from functools import partial
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+# A typical 60-entry digest PDF is about 58 KB
+DOCUMENT = os.urandom(60_000)
+
+received = {"bytes": 0, "uploads": 0, "by_id": 0}
+known_file_ids = set()
+uplink_bits_per_second = [0]
+
+
+async def send_document(request):
+    body = await request.body()
+    received["bytes"] += len(body)
+    if b'filename=' in body:
+        received["uploads"] += 1
+        if uplink_bits_per_second[0]:
+            await asyncio.sleep(len(body) * 8 / uplink_bits_per_second[0])
+        file_id = f"F{len(known_file_ids)}"
+        known_file_ids.add(file_id)
+    else:
+        received["by_id"] += 1
+        file_id = next((known for known in known_file_ids if known.encode() in body), None)
+        if file_id is None:
+            return JSONResponse({"ok": False, "error_code": 400, "description": "Bad Request: wrong file identifier/http url specified"}, status_code=400)
+    return JSONResponse({"ok": True, "result": {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"},
+                                                "document": {"file_id": file_id, "file_unique_id": f"u{file_id}"}}})
+
+
+async def get_me(request):
+    # Bot.initialize asks who it is
+    return JSONResponse({"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench"}})
+
+
+def start_stand_in() -> int:
+    app = Starlette(routes=[Route("/bot1:a/sendDocument", send_document, methods=["POST"]), Route("/bot1:a/getMe", get_me, methods=["POST"])])
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    threading.Thread(target=lambda: uvicorn.run(app, host="127.0.0.1", port=port, log_level="error"), daemon=True).start()
+    time.sleep(1.5)
+    return port
+
+
+async def run(bot, label: str, reuse: bool, sends: int):
+    from telegram import InputFile
+    from src.bot.file_id_store import FileIdStore
+    store = FileIdStore()
+    for key in received:
+        received[key] = 0
+    latencies = []
+    for chat in range(sends):
+        started = time.perf_counter()
+        if reuse:
+            await store.send(partial(bot.send_document, chat), DOCUMENT, "digest.pdf")
+        else:
+            await bot.send_document(chat, InputFile(DOCUMENT, filename="digest.pdf"))
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    print(f"  {label:<36} {received['bytes'] / 1e6:6.2f} MB sent, {received['uploads']:3} uploads, "
+          f"p50 {latencies[sends // 2] * 1000:5.1f} ms, p95 {latencies[int(sends * 0.95)] * 1000:5.1f} ms")
+
+
+async def main():
+    from telegram import Bot
+    from src.bot.file_id_store import FileIdStore
+    sends = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    port = start_stand_in()
+    async with Bot("1:a", base_url=f"http://127.0.0.1:{port}/bot") as bot:
+        print(f"{sends} sends of one {len(DOCUMENT) // 1000} KB document:")
+        for bandwidth, name in ((0, "loopback"), (20e6, "20 Mbit/s uplink")):
+            uplink_bits_per_second[0] = bandwidth
+            await run(bot, f"{name}, upload each time", False, sends)
+            await run(bot, f"{name}, file_id reuse", True, sends)
+        uplink_bits_per_second[0] = 0
+
+        store = FileIdStore()
+        await store.send(partial(bot.send_document, 1), DOCUMENT, "stale.pdf")
+        known_file_ids.clear()  # Telegram no longer knows the file
+        for key in received:
+            received[key] = 0
+        await store.send(partial(bot.send_document, 2), DOCUMENT, "stale.pdf")
+        await store.send(partial(bot.send_document, 3), DOCUMENT, "stale.pdf")
+        print(f"After the stand-in forgot the file, 2 sends: {received['by_id']} sends by id (the first rejected), {received['uploads']} upload")
+
+        other = os.urandom(50_000)
+        for key in received:
+            received[key] = 0
+        await asyncio.gather(*(store.send(partial(bot.send_document, chat), other, "other.pdf") for chat in range(10)))
+        print(f"10 concurrent first sends: {received['uploads']} upload, {received['by_id']} sends by id")
+        print(store.stats())
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
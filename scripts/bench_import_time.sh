@@ -0,0 +1,5 @@
+# Run from the repository root with: sh scripts/bench_import_time.sh
+echo "Measuring import time of src.main"
+# Per-module breakdown goes to importtime.log, slowest cumulative imports are printed
+python -X importtime -c "import src.main" 2> importtime.log
+sort -t'|' -k2 -n -r importtime.log | head -25
@@ -0,0 +1,89 @@
+"""
+Near-duplicate clustering: pairwise precision / recall on hand-labelled headlines, clustering throughput on synthetic
+headlines, and news_post_processing on a 100-item topic feed whose items each list 5 related articles.
+Run from the repository root with: PYTHONPATH=. python scripts/bench_near_duplicates.py
+"""
+import itertools
+import os
+import random
+import time
+from pathlib import Path
+
+# The fetch path imports the database settings, nothing connects
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://bench@localhost/bench")
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def precision_recall():
+    from src.utils.article import Article
+    from src.utils.dedupe import cluster_articles
+    rows = [line.strip().split('|', 1) for line in (FIXTURES / "near_duplicate_headlines.txt").read_text().splitlines()
+            if line.strip() and not line.startswith('#')]
+    articles = [Article.create(title, f"https://example.com/{i}", None, 1_700_000_000 - i) for i, (_, title) in enumerate(rows)]
+    labels = [story for story, _ in rows]
+    print(f"{len(rows)} labelled headlines in {len(set(labels))} stories, pairwise:")
+    for min_similarity in (0.3, 0.4, 0.5, 0.6, 0.7):
+        clusters = cluster_articles(articles, min_similarity, use_sub_articles=False)
+        predicted = {i: number for number, cluster in enumerate(clusters) for i in cluster}
+        true_positives = false_positives = false_negatives = 0
+        for i, j in itertools.combinations(range(len(articles)), 2):
+            same_story, same_cluster = labels[i] == labels[j], predicted[i] == predicted[j]
+            true_positives += same_story and same_cluster
+            false_positives += not same_story and same_cluster
+            false_negatives += same_story and not same_cluster
+        print(f"  min_similarity {min_similarity}: precision {true_positives / max(true_positives + false_positives, 1):.2f}, "
+              f"recall {true_positives / (true_positives + false_negatives):.2f}, {len(clusters)} clusters")
+
+
+def throughput():
+    from src.utils.article import Article
+    from src.utils.dedupe import cluster_articles, _headline_features
+    # 3000 stories over a 5000-word vocabulary, half of the headlines reworded by one word
+    random.seed(0)
+    vocabulary = [f"w{i}" for i in range(5000)]
+    stories = [[random.choice(vocabulary) for _ in range(9)] for _ in range(3000)]
+    articles = []
+    for i in range(20000):
+        words = list(random.choice(stories))
+        if random.random() < 0.5:
+            words[random.randrange(9)] = random.choice(vocabulary)
+        articles.append(Article.create(" ".join(words) + " - Publisher", f"https://example.com/{i}", None, i))
+    print("Clustering throughput, cold headline cache:")
+    for count in (1000, 5000, 20000):
+        _headline_features.cache_clear()
+        started = time.perf_counter()
+        clusters = cluster_articles(articles[:count])
+        elapsed = time.perf_counter() - started
+        print(f"  {count} articles: {elapsed * 1000:.0f} ms, {count / elapsed:.0f} articles/s, {len(clusters)} clusters")
+
+
+def post_processing(runs = 20):
+    from src.utils import rss_parser
+    from src.utils.article import with_sub_articles
+    from src.utils.scraping_functions import news_post_processing
+    from src.utils.dedupe import _headline_features
+    body = (FIXTURES / "topic_feed.xml").read_bytes()
+    started = time.perf_counter()
+    entries = rss_parser.parse_feed(body)['entries']
+    parsed = time.perf_counter() - started
+    started = time.perf_counter()
+    entries = with_sub_articles(entries)
+    attached = time.perf_counter() - started
+    print(f"topic_feed.xml ({len(entries)} items): parse {parsed * 1000:.1f} ms, attaching sub-articles {attached * 1000:.1f} ms once per fetch")
+    for min_similarity in (None, 0.5):
+        _headline_features.cache_clear()
+        started = time.perf_counter()
+        news_post_processing(entries, min_similarity=min_similarity)
+        first = time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(runs):
+            kept = news_post_processing(entries, min_similarity=min_similarity)
+        print(f"  news_post_processing min_similarity={min_similarity}: first call {first * 1000:.2f} ms, "
+              f"cache hit {(time.perf_counter() - started) / runs * 1000:.2f} ms, {len(kept)} kept")
+
+
+if __name__ == '__main__':
+    precision_recall()
+    throughput()
+    post_processing()
@@ -0,0 +1,95 @@
+"""
+Percolator build and match times on synthetic saved queries and headlines, against checking every clause per article.
+Queries mix plain words, phrases, OR, exclusions, site:, intitle: and unsupported AROUND over a Zipf vocabulary.
+Run from the repository root with: PYTHONPATH=. python scripts/bench_percolator.py [saved queries] [articles]
+"""
+import itertools
+import os
+import random
+import sys
+import time
+
+# The fetch path imports the database settings, nothing connects
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://bench@localhost/bench")
+
+VOCABULARY = [f"w{i}" for i in range(30000)]
+STOPWORDS = ["the", "a", "of", "to", "in", "and"]
+SITES = [f"site{i}.com" for i in range(300)]
+# Headlines draw from the whole vocabulary, queries skip the 200 most common words like people do
+HEADLINE_WEIGHTS = list(itertools.accumulate(1 / (i + 1) for i in range(len(VOCABULARY))))
+QUERY_WEIGHTS = list(itertools.accumulate(1 / (i + 1) ** 0.8 for i in range(200, len(VOCABULARY))))
+
+
+def headline_words(k: int) -> list:
+    return random.choices(VOCABULARY, cum_weights=HEADLINE_WEIGHTS, k=k)
+
+
+def query_words(k: int) -> list:
+    return random.choices(VOCABULARY[200:], cum_weights=QUERY_WEIGHTS, k=k)
+
+
+def saved_query() -> str:
+    kind = random.random()
+    query = " ".join(query_words(random.randint(1, 3)))
+    if kind < 0.2:
+        return f'"{" ".join(query_words(2))}" {query}'
+    if kind < 0.35:
+        return f"{query} OR {' '.join(query_words(2))}"
+    if kind < 0.45:
+        return f"{query} -{query_words(1)[0]}"
+    if kind < 0.55:
+        return f"{query} site:{random.choice(SITES)}"
+    if kind < 0.555:
+        return f"site:{random.choice(SITES)}"
+    if kind < 0.62:
+        return f"intitle:{query_words(1)[0]} {query}"
+    if kind < 0.63:
+        return f"{query} AROUND(3) x"
+    return query
+
+
+def main():
+    from src.utils.article import Article
+    from src.utils.percolator import Percolator, _padded
+    from src.utils.search_query import words
+    query_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    article_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    random.seed(1)
+    queries = [(i % 20000, saved_query()) for i in range(query_count)]
+    now = int(time.time())
+    articles = []
+    for i in range(article_count):
+        title = headline_words(random.randint(7, 13))
+        for _ in range(3):
+            title.insert(random.randrange(len(title)), random.choice(STOPWORDS))
+        site = random.choice(SITES)
+        articles.append(Article.create(" ".join(title) + f" - Pub{site}", f"https://example.com/{i}", f"Pub{site}", now, None, f"https://www.{site}"))
+
+    started = time.perf_counter()
+    percolator = Percolator(queries)
+    print(f"{query_count} saved queries: build {time.perf_counter() - started:.2f}s, {len(percolator)} distinct, "
+          f"{len(percolator._clauses)} clauses, {percolator.skipped} skipped")
+
+    for _ in range(2):
+        started = time.perf_counter()
+        query_hits = 0
+        for article in articles:
+            query_hits += len(percolator.match(article))
+        elapsed = time.perf_counter() - started
+        print(f"  match {article_count} articles: {elapsed * 1000:.0f} ms, {elapsed / article_count * 1e6:.0f} us per article, "
+              f"{query_hits / article_count:.1f} query hits per article")
+
+    # The alternative: verify every clause against every article
+    sample = articles[:100]
+    started = time.perf_counter()
+    for article in sample:
+        title_words = words(article.title)
+        text, title = _padded(title_words + words(article.publisher)), _padded(title_words)
+        host = article.publisher_url.split('//')[1].removeprefix('www.')
+        for clause in percolator._clauses:
+            clause.matches(text, title, host)
+    print(f"  checking every clause: {(time.perf_counter() - started) / len(sample) * 1000:.0f} ms per article")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Render throughput of the PDF render pool for 1, 2, 4 ... workers up to the number of cores.
+Run from the repository root with: PYTHONPATH=. python scripts/bench_render_pool.py [renders per run] [entries per PDF]
+"""
+import asyncio
+import os
+import sys
+import time
+
+
+async def run(executor: str, workers: int, renders: int, entries: int) -> float:
+    from src.utils.article import Article
+    from src.utils.render_service import RenderService
+    articles = [Article.create(f"Headline {i} about a story with a reasonably long title for wrapping - Publisher", f"https://news.example.com/{i}",
+                               "Publisher", 1700000000 + i) for i in range(entries)]
+    service = RenderService(executor, workers, max_queue=renders, timeout=600)
+    await service.start()
+    # One untimed round first, so every worker has its imports and width caches warm
+    await asyncio.gather(*(service.render(articles, f"warm-up {i} {time.time_ns()}") for i in range(workers)))
+    started = time.perf_counter()
+    # Distinct titles, so every render misses the PDF cache
+    await asyncio.gather(*(service.render(articles, f"{executor} {workers} {run_id} {time.time_ns()}") for run_id in range(renders)))
+    elapsed = time.perf_counter() - started
+    service.shutdown()
+    return elapsed
+
+
+async def main():
+    renders = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    entries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    cores = os.cpu_count() or 1
+    print(f"{cores} cores, {renders} PDFs of {entries} entries per run")
+    baseline = await run('inline', 1, renders, entries)
+    print(f"inline      {renders / baseline:6.1f} PDFs/s")
+    workers = 1
+    while True:
+        elapsed = await run('process', workers, renders, entries)
+        print(f"process x{workers:<2} {renders / elapsed:6.1f} PDFs/s  {baseline / elapsed:4.2f}x inline")
+        if workers >= cores:
+            break
+        workers = min(workers * 2, cores)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,46 @@
+"""
+The streaming lxml RSS parser against feedparser on scripts/fixtures/topic_feed.xml: checks both give the same articles,
+then times parsing, Article construction and attaching the sub-articles listed in the summaries.
+Run from the repository root with: PYTHONPATH=. python scripts/bench_rss_parser.py [runs]
+"""
+import sys
+import time
+from pathlib import Path
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def timed(function, runs: int) -> tuple:
+    """Mean milliseconds per run and the last result"""
+    started = time.perf_counter()
+    for _ in range(runs):
+        result = function()
+    return (time.perf_counter() - started) / runs * 1000, result
+
+
+def main():
+    import feedparser
+    from src.utils import rss_parser
+    from src.utils.article import Article, with_sub_articles
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    body = (FIXTURES / "topic_feed.xml").read_bytes()
+
+    fast_ms, fast = timed(lambda: rss_parser.parse_feed(body)['entries'], runs)
+    feedparser_ms, parsed = timed(lambda: feedparser.parse(body.decode()), runs)
+    slow = [Article.from_feedparser(entry) for entry in parsed['entries'] if entry.get('published_parsed')]
+    assert len(fast) == len(slow), (len(fast), len(slow))
+    for field in ('title', 'link', 'published', 'publisher', 'sub_articles'):
+        assert all(getattr(a, field) == getattr(b, field) for a, b in zip(fast, slow)), field
+    print(f"{len(fast)} items, same title/link/published/publisher/sub_articles from both parsers")
+    print(f"  lxml parse_feed {fast_ms:.1f} ms, feedparser {feedparser_ms:.1f} ms")
+
+    # Article.create leaves sub_articles to be parsed on access, with_sub_articles parses them once per fetched feed
+    create_ms, _ = timed(lambda: [Article.create(a.title, a.link, a.publisher, a.published, a.summary, a.publisher_url) for a in fast], runs)
+    attach_ms, attached = timed(lambda: with_sub_articles(fast), runs)
+    read_ms, _ = timed(lambda: [a.sub_articles for a in attached], runs)
+    print(f"  Article.create x{len(fast)} {create_ms:.2f} ms, with_sub_articles {attach_ms:.1f} ms, "
+          f"reading attached sub_articles {read_ms:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
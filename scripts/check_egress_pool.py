@@ -0,0 +1,104 @@
+"""
+Exercise the egress pool against local stand-ins: a fake Google News origin, a forwarding proxy and a broken proxy.
+Run from the repository root with: PYTHONPATH=. python scripts/check_egress_pool.py
+"""
+import asyncio
+import os
+import socket
+import time
+
+RSS = b"""<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Local</title>
+<item><title>Local story - Local Times</title><link>https://example.com/story</link>
+<pubDate>Mon, 18 Nov 2024 10:00:00 GMT</pubDate><source url="https://example.com">Local Times</source></item>
+</channel></rss>"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def read_request(reader):
+    request_line = (await reader.readline()).decode()
+    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+        pass
+    return request_line.split()[1]
+
+
+def response(status: int, body: bytes) -> bytes:
+    return f"HTTP/1.1 {status} X\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+
+
+async def origin(reader, writer):
+    # /rss/ok serves a feed, anything else is a 404 like a bad topic hash
+    path = await read_request(reader)
+    writer.write(response(200, RSS) if path.endswith('/rss/ok') else response(404, b'not found'))
+    await writer.drain()
+    writer.close()
+
+
+async def forwarding_proxy(reader, writer):
+    # An HTTP proxy gets the absolute URL, relay it to the origin
+    url = await read_request(reader)
+    host, port = url.split('/')[2].split(':')
+    upstream_reader, upstream_writer = await asyncio.open_connection(host, int(port))
+    upstream_writer.write(f"GET /{url.split('/', 3)[3]} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    writer.write(await upstream_reader.read())
+    upstream_writer.close()
+    await writer.drain()
+    writer.close()
+
+
+async def broken_proxy(reader, writer):
+    await read_request(reader)
+    writer.write(response(502, b'bad gateway'))
+    await writer.drain()
+    writer.close()
+
+
+async def main():
+    ports = [free_port() for _ in range(3)]
+    os.environ["EGRESS_DIRECT"] = "false"
+    os.environ["EGRESS_PROXIES"] = f"http://127.0.0.1:{ports[1]},http://127.0.0.1:{ports[2]}"
+    servers = [await asyncio.start_server(handler, '127.0.0.1', port)
+               for handler, port in zip((origin, forwarding_proxy, broken_proxy), ports)]
+
+    # Imported after the environment is set, the pool is built from it
+    from src.pygooglenews import GoogleNews, FeedStatusError, close_http_clients
+    from src.utils.egress_pool import egress_pool
+    request_through_pool = GoogleNews()._GoogleNews__request_through_pool
+    healthy, broken = egress_pool.members
+    base = f"http://127.0.0.1:{ports[0]}"
+
+    for _ in range(20):
+        r = await request_through_pool(f"{base}/rss/ok", {})
+        assert r.status_code == 200 and b'Local story' in r.content
+    # Once it has failed, the broken proxy loses every two-choice comparison and only gets traffic again after the healthy one fails
+    assert broken.requests <= 2 and healthy.requests == 20, "traffic kept going to the broken proxy"
+    print(f"20 fetches succeeded, the broken proxy got {broken.requests} of {healthy.requests + broken.requests} attempts")
+
+    # Failing in a row gets a member ejected
+    for _ in range(3):
+        egress_pool.report(broken, 0.0, ok=False)
+    assert not broken.is_available(time.monotonic()), "broken proxy not ejected"
+
+    failures_before = (healthy.failures, broken.failures)
+    requests_before = healthy.requests + broken.requests
+    try:
+        await request_through_pool(f"{base}/rss/topics/bad", {})
+        raise AssertionError("404 did not raise")
+    except FeedStatusError as e:
+        assert e.status_code == 404
+    assert (healthy.failures, broken.failures) == failures_before, "a 404 was counted against a proxy"
+    assert healthy.requests + broken.requests == requests_before + 1, "a 404 was retried on another proxy"
+    print("404 raised after one attempt without counting against the proxy")
+    print(egress_pool.stats())
+
+    await close_http_clients()
+    for server in servers:
+        server.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
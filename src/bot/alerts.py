@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from html import escape
+from telegram import Bot
+from src.database.database import get_db
+import src.database.crud as crud
+from src.utils.percolator import Percolator, new_articles
+from src.utils.seen_store import seen_store
+from src.utils.constants import ALERT_INTERVAL_SECONDS, ALERT_RELOAD_SECONDS, ALERT_MAX_ARTICLES_PER_MESSAGE
+
+# Breaking-news alerts: every ALERT_INTERVAL_SECONDS, the articles fetched for the first time since the last run
+# (by any user, the prefetcher or the digests) are percolated through the saved queries of the subscribed users,
+# and each user gets one message with the matching articles they have not received yet.
+
+_state = {"percolator": None, "rows": None, "loaded_at": 0.0, "reload": True}
+_stats = {"runs": 0, "articles": 0, "alerts_sent": 0, "last_build_ms": None, "last_match_ms": None, "queries": 0, "skipped_queries": 0}
+
+
+def request_reload():
+    """Rebuild the percolator on the next run, after a subscription or a saved query changed"""
+    _state["reload"] = True
+
+
+async def load_percolator() -> Percolator:
+    """The current percolator, rebuilt when asked to or every ALERT_RELOAD_SECONDS if the saved queries changed"""
+    if not _state["reload"] and time.monotonic() - _state["loaded_at"] < ALERT_RELOAD_SECONDS:
+        return _state["percolator"]
+    _state["reload"] = False
+    async with get_db() as db:
+        rows = await crud.get_alert_queries_with_tele_id(db)
+    _state["loaded_at"] = time.monotonic()
+    if rows != _state["rows"]:
+        started = time.perf_counter()
+        # Building over 100k queries takes seconds, keep it off the event loop
+        percolator = await asyncio.to_thread(Percolator, (((user_id, tele_id), query) for user_id, tele_id, query in rows))
+        _stats["last_build_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        _stats["queries"], _stats["skipped_queries"] = len(rows), percolator.skipped
+        _state["percolator"], _state["rows"] = percolator, rows
+    return _state["percolator"]
+
+
+def match_articles(percolator: Percolator, articles) -> dict:
+    """Map each subscriber to {link: (article, first matching query)}"""
+    matches = defaultdict(dict)
+    for article in articles:
+        for query, subscribers in percolator.match(article):
+            for subscriber in subscribers:
+                matches[subscriber].setdefault(article.link, (article, query))
+    return matches
+
+
+def format_alert(found: list) -> str:
+    lines = [f'• <a href="{escape(article.link)}">{escape(article.title)}</a>\n  <i>{escape(query)}</i>' for article, query in found]
+    return "Breaking news for your saved queries:\n\n" + "\n".join(lines)
+
+
+async def send_alerts(bot: Bot) -> int:
+    """Percolate the new articles and send the alerts, returns the number of users alerted"""
+    articles = new_articles.drain()
+    if not articles:
+        return 0
+    percolator = await load_percolator()
+    if not percolator:
+        return 0
+    started = time.perf_counter()
+    matches = await asyncio.to_thread(match_articles, percolator, articles)
+    _stats["last_match_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    _stats["articles"] += len(articles)
+
+    alerted = 0
+    for (user_id, tele_id), found in matches.items():
+        try:
+            unseen = {article.link for article in await seen_store.unseen(user_id, [article for article, _ in found.values()])}
+            found = sorted((match for link, match in found.items() if link in unseen), key=lambda match: match[0].published, reverse=True)
+            if not found:
+                continue
+            found = found[:ALERT_MAX_ARTICLES_PER_MESSAGE]
+            await bot.send_message(chat_id=tele_id, text=format_alert(found), parse_mode="HTML", disable_web_page_preview=True)
+            await seen_store.mark_delivered(user_id, [article for article, _ in found])
+            alerted += 1
+        except Exception as e:
+            logging.warning(f"Could not send alert to {tele_id}: {e}")
+    _stats["alerts_sent"] += alerted
+    logging.info(f"Alerts: {len(articles)} new articles against {len(percolator)} queries in {_stats['last_match_ms']} ms, {alerted} users alerted")
+    return alerted
+
+
+async def run_alert_dispatcher(bot: Bot):
+    new_articles.enabled = True
+    while True:
+        await asyncio.sleep(ALERT_INTERVAL_SECONDS)
+        _stats["runs"] += 1
+        try:
+            await send_alerts(bot)
+        except Exception as e:
+            logging.error(f"Alert delivery failed: {e}")
+
+
+def stats():
+    return {**_stats, **new_articles.stats()}
@@ -1,31 +1,79 @@
 import src.utils.scraping_functions as sf
 import src.utils.helper_functions as hf
-from telegram import InputFile, Update, ReplyKeyboardRemove
+from telegram import Update, ReplyKeyboardRemove
 from telegram.ext._contexttypes import ContextTypes
 from telegram.ext import ConversationHandler
 from src.database.database import get_db
 import src.database.crud as crud
 import src.utils.errors as err_fn
 from src.utils.google_search_help import google_search_operator
+from src.utils.dedupe import BatchDedupe
+from src.utils.seen_store import seen_store
+from src.utils.render_service import render_service, RenderBusy
+from src.bot.alerts import request_reload
+from src.bot.file_id_store import file_id_store
 import logging
+import time
+from telegram.error import BadRequest
+from datetime import datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from src.database.models import TopicPreference, UserQuery
-from src.utils.constants import help_message
+from src.utils.constants import help_message, DIGEST_PROGRESS_EDIT_SECONDS
+async def render_pdf(message, news: list, title: str):
+    """The PDF bytes rendered by the render service, or None after telling the user it is busy or too slow"""
+    try:
+        return await render_service.render(news, title)
+    except RenderBusy:
+        await message.reply_text("The bot is busy making other PDFs, please try again in a minute.")
+    except TimeoutError:
+        await message.reply_text("Making the PDF took too long, please try again later.")
+    return None
+
 # top_news_conv_handler
 async def send_top_news(update: Update, _: ContextTypes.DEFAULT_TYPE, country = "US"):
     await update.message.reply_text("Fetching top news...", reply_markup=ReplyKeyboardRemove())
-    top_news = sf.get_top_news(country = country)
+    top_news = await sf.get_top_news(country = country)
     await update.message.reply_text("Converting to PDF...")
-    pdf_buffer = hf.to_pdf_from_entries(top_news, "Top News")
+    pdf = await render_pdf(update.message, top_news, "Top News")
+    if pdf is None:
+        return
     current_date = hf.get_current_date()
     print(current_date)
     filename = f"{current_date}_{country}_top_news.pdf"
     print(filename)
-    await update.message.reply_document(document = InputFile(pdf_buffer, filename = filename))
+    await file_id_store.send(update.message.reply_document, pdf, filename)
 
 async def send_all_topic_news(update: Update, context: ContextTypes.DEFAULT_TYPE, saved_topics_list : list[TopicPreference]):
-#   send as a batch instead of one by one 
-    for topic in saved_topics_list:
-        await send_topic_news(update, context, topic.topic_name, topic.topic_hash, topic.country_code)
+    # Fetch all saved topics concurrently and send each PDF as soon as its feed is ready
+    message = update.message if update.message else update.callback_query.message
+    filter_num_days = context.user_data.get("filter_num_days", 0)
+    country_by_topic = {topic.topic_name: topic.country_code for topic in saved_topics_list}
+    specs = [sf.topic_spec(topic.topic_name, topic.topic_hash, topic.country_code, filter_num_days) for topic in saved_topics_list]
+    if context.user_data.get("combined"):
+        days = f"_{filter_num_days}_days" if filter_num_days else ""
+        await send_combined_news(message, context, specs, "Topics Digest", f"{hf.get_current_date()}_topics{days}_digest.pdf",
+                                 lambda spec: f"{spec.label.upper()} ({country_by_topic[spec.label]})")
+        return
+    # A story matching several topics only goes into the first PDF sent
+    batch = BatchDedupe()
+    delivered = []
+    async for spec, topic_news, error in sf.fetch_many(specs):
+        if error:
+            logging.error(error)
+            await message.reply_text(f"Could not fetch news for {spec.label}: {error}")
+            continue
+        claimed_news = batch.claim(topic_news)
+        if topic_news and not claimed_news:
+            await message.reply_text(f"All news for {spec.label} is already in the PDFs above.")
+            continue
+        new_news = await keep_new_articles(context, claimed_news)
+        if claimed_news and not new_news:
+            await message.reply_text(f"No new news for {spec.label} since last time.")
+            continue
+        await reply_topic_news(message, spec.label, country_by_topic[spec.label], filter_num_days, new_news)
+        delivered += new_news
+    logging.info(f"Batch of {len(specs)} topics: {batch.dropped} articles already sent in another topic")
+    await record_delivered(context, delivered)
 
 
 async def send_topic_news(update: Update, context: ContextTypes.DEFAULT_TYPE, topic_name:str, topic_hash:str, country_code = "US"):
@@ -38,50 +86,177 @@ async def send_topic_news(update: Update, context: ContextTypes.DEFAULT_TYPE, to
     await message.reply_text(f"Fetching top news for {topic_name}...", reply_markup=ReplyKeyboardRemove())
     
     filter_num_days = context.user_data.get("filter_num_days", 0)
-    topic_news = sf.get_topic_headline_by_topic(topic_hash, country_code, filter_num_days=filter_num_days)
+    topic_news = await sf.get_topic_headline_by_topic(topic_hash, country_code, filter_num_days=filter_num_days)
+    new_news = await keep_new_articles(context, topic_news)
+    if topic_news and not new_news:
+        await message.reply_text(f"No new news for {topic_name} since last time.")
+        return
+    await reply_topic_news(message, topic_name, country_code, filter_num_days, new_news)
+    await record_delivered(context, new_news)
 
+async def reply_topic_news(message, topic_name: str, country_code: str, filter_num_days: int, topic_news: list):
     if len(topic_news) > 0:
-        pdf_buffer = hf.to_pdf_from_entries(topic_news, topic_name.upper())
+        pdf = await render_pdf(message, topic_news, topic_name.upper())
+        if pdf is None:
+            return
         current_date = hf.get_current_date()
         filename = f"{current_date}_{topic_name}_{country_code}_news.pdf"
         if filter_num_days:
             filename = f"{current_date}_{topic_name}_{country_code}_{filter_num_days}_days_news.pdf"
         
-        await message.reply_document(document=InputFile(pdf_buffer, filename=filename))
+        await file_id_store.send(message.reply_document, pdf, filename)
     else:
         await message.reply_text(f"<b>No news found for {topic_name} in the last {filter_num_days} days.</b>", parse_mode="HTML")
 
 async def send_all_query_news(update: Update, context: ContextTypes.DEFAULT_TYPE, saved_queries_list : list[UserQuery]):
+    # Fetch all saved queries concurrently and send each PDF as soon as its feed is ready
+    message = update.message if update.message else update.callback_query.message
+    filenames = {}
+    specs = []
+    for saved_query in saved_queries_list:
+        query_kwargs, filenames[saved_query.query] = query_filter_args(context, saved_query.query)
+        specs.append(sf.query_spec(saved_query.query, local_first=context.user_data.get("local_first", False), **query_kwargs))
+    if context.user_data.get("combined"):
+        await send_combined_news(message, context, specs, "Saved Queries Digest", f"{hf.get_current_date()}_queries_digest.pdf", lambda spec: spec.label)
+        return
+    await message.reply_text(f"Fetching news for {len(saved_queries_list)} saved queries...", reply_markup=ReplyKeyboardRemove())
+    # A story matching several queries only goes into the first PDF sent
+    batch = BatchDedupe()
+    delivered = []
+    async for spec, query_news, error in sf.fetch_many(specs):
+        if error:
+            logging.error(error)
+            await message.reply_text(f"Could not fetch news for '{spec.label}': {error}")
+            continue
+        claimed_news = batch.claim(query_news)
+        if query_news and not claimed_news:
+            await message.reply_text(f"All news for '{spec.label}' is already in the PDFs above.")
+            continue
+        new_news = await keep_new_articles(context, claimed_news)
+        if claimed_news and not new_news:
+            await message.reply_text(f"No new news for '{spec.label}' since last time.")
+            continue
+        await reply_query_news(message, spec.label, filenames[spec.label], new_news)
+        delivered += new_news
+    logging.info(f"Batch of {len(specs)} queries: {batch.dropped} articles already sent for another query")
+    await record_delivered(context, delivered)
 
-    for query in saved_queries_list:
-        await send_query_news(update, context, query.query)
+async def edit_progress(progress, text: str):
+    try:
+        await progress.edit_text(text)
+    except BadRequest as e:
+        # e.g. "message is not modified", progress updates are best effort
+        logging.warning(f"Could not update progress message: {e.message}")
 
-async def send_query_news(update: Update, context: ContextTypes.DEFAULT_TYPE, query:str):
-    if update.message:
-        message = update.message
-    else:
-        message = update.callback_query.message
-    await message.reply_text(f"Fetching news for '{query}'...", reply_markup=ReplyKeyboardRemove())
-    
-    # decide whether to use when, from_to or default
+async def send_combined_news(message, context: ContextTypes.DEFAULT_TYPE, specs: list, file_title: str, filename: str, section_title):
+    """
+    With the -d flag, all saved topics or queries go into one PDF with a section per feed, sent with a single upload.
+    One progress message is edited in place instead of a message per feed.
+    """
+    progress = await message.reply_text(f"Fetching news for {len(specs)} feeds...")
+    results = {}
+    last_edit = time.monotonic()
+    async for spec, news, error in sf.fetch_many(specs):
+        results[id(spec)] = (news, error)
+        if error:
+            logging.error(error)
+        # Edits are throttled, Telegram limits how often one message can change
+        if len(results) < len(specs) and time.monotonic() - last_edit >= DIGEST_PROGRESS_EDIT_SECONDS:
+            await edit_progress(progress, f"Fetched {len(results)}/{len(specs)} feeds...")
+            last_edit = time.monotonic()
+
+    # Sections keep the saved order, a story matching several feeds only goes into the first section
+    batch = BatchDedupe()
+    sections = []
+    delivered = []
+    for spec in specs:
+        news, error = results[id(spec)]
+        if error:
+            sections.append((section_title(spec), [], "could not be fetched"))
+            continue
+        claimed_news = batch.claim(news)
+        new_news = await keep_new_articles(context, claimed_news)
+        if new_news:
+            sections.append((section_title(spec), new_news, None))
+            delivered += new_news
+        elif not news:
+            sections.append((section_title(spec), [], "no news found"))
+        elif not claimed_news:
+            sections.append((section_title(spec), [], "already in the sections above"))
+        else:
+            sections.append((section_title(spec), [], "no new news since last time"))
+    logging.info(f"Combined digest of {len(specs)} feeds: {batch.dropped} articles already in another section")
+    if not delivered:
+        await edit_progress(progress, "No news to send:\n" + "\n".join(f"{title}: {note}" for title, _, note in sections))
+        return
+
+    filled = sum(1 for _, entries, _ in sections if entries)
+    await edit_progress(progress, f"Rendering {len(delivered)} articles from {filled}/{len(specs)} feeds...")
+    try:
+        pdf = await render_service.render_sections(sections, file_title)
+    except RenderBusy:
+        await edit_progress(progress, "The bot is busy making other PDFs, please try again in a minute.")
+        return
+    except TimeoutError:
+        await edit_progress(progress, "Making the PDF took too long, please try again later.")
+        return
+    await file_id_store.send(message.reply_document, pdf, filename)
+    await edit_progress(progress, f"{file_title}: {len(delivered)} articles from {filled}/{len(specs)} feeds.")
+    await record_delivered(context, delivered)
+
+async def keep_new_articles(context: ContextTypes.DEFAULT_TYPE, news: list) -> list:
+    """With the -n flag, drop the articles already delivered to this user"""
+    if not context.user_data.get("only_new") or not news:
+        return news
+    try:
+        return await seen_store.unseen(context.user_data["id"], news)
+    except Exception as e:
+        logging.error(f"Could not read delivered articles, sending everything: {e}")
+        return news
+
+async def record_delivered(context: ContextTypes.DEFAULT_TYPE, news: list):
+    try:
+        await seen_store.mark_delivered(context.user_data["id"], news)
+    except Exception as e:
+        logging.error(f"Could not record delivered articles: {e}")
+
+def query_filter_args(context: ContextTypes.DEFAULT_TYPE, query: str):
+    """Return the search time filter (when or from_/to_) chosen in the conversation and the matching PDF filename"""
     filter_choice = context.user_data.get("filter_choice", "default")
     current_date = hf.get_current_date()
     if filter_choice == "when":
         when = context.user_data.get("when", "1d")
-        query_news = sf.get_news_by_query(query, when)
-        filename = f"{current_date}_{query}_{when}_news.pdf"
+        return {"when": when}, f"{current_date}_{query}_{when}_news.pdf"
     elif filter_choice == "from_to":
         from_ = context.user_data.get("from_", None)
         to_ = context.user_data.get("to_", None)
-        query_news = sf.get_news_by_query(query, from_=from_, to_=to_)
-        filename = f"{current_date}_{query}_{from_}_to_{to_}news.pdf"
+        return {"from_": from_, "to_": to_}, f"{current_date}_{query}_{from_}_to_{to_}news.pdf"
     else:
-        query_news = sf.get_news_by_query(query, when="1d")
-        filename = f"{current_date}_{query}_1d_news.pdf"
-    if len(query_news) > 0:
-        pdf_buffer = hf.to_pdf_from_entries(query_news, query)
+        return {"when": "1d"}, f"{current_date}_{query}_1d_news.pdf"
+
+async def send_query_news(update: Update, context: ContextTypes.DEFAULT_TYPE, query:str):
+    if update.message:
+        message = update.message
+    else:
+        message = update.callback_query.message
+    await message.reply_text(f"Fetching news for '{query}'...", reply_markup=ReplyKeyboardRemove())
+    
+    # decide whether to use when, from_to or default
+    query_kwargs, filename = query_filter_args(context, query)
+    query_news = await sf.get_news_by_query(query, local_first=context.user_data.get("local_first", False), **query_kwargs)
+    new_news = await keep_new_articles(context, query_news)
+    if query_news and not new_news:
+        await message.reply_text(f"No new news for '{query}' since last time.")
+        return
+    await reply_query_news(message, query, filename, new_news)
+    await record_delivered(context, new_news)
 
-        await message.reply_document(document=InputFile(pdf_buffer, filename=filename))
+async def reply_query_news(message, query: str, filename: str, query_news: list):
+    if len(query_news) > 0:
+        pdf = await render_pdf(message, query_news, query)
+        if pdf is None:
+            return
+        await file_id_store.send(message.reply_document, pdf, filename)
     else:
         await message.reply_text(f"<b>No news found for {query}.</b>", parse_mode="HTML")
 
@@ -147,6 +322,68 @@ async def display_user_queries(update: Update, context: ContextTypes.DEFAULT_TYP
         await message.reply_text(f"Here are your saved queries:\n{queries_list}")
         
         
+async def subscribe_digest(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/subscribe_digest HH:MM [timezone]"""
+    if not context.args:
+        await update.message.reply_text("Usage: /subscribe_digest HH:MM [timezone], e.g. /subscribe_digest 07:30 Asia/Singapore")
+        return
+    try:
+        delivery_time = datetime.strptime(context.args[0], "%H:%M").time()
+    except ValueError:
+        await update.message.reply_text("Invalid time. Please use the 24-hour HH:MM format, e.g. 07:30")
+        return
+    timezone = context.args[1] if len(context.args) > 1 else "UTC"
+    try:
+        ZoneInfo(timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        await update.message.reply_text(f"Unknown timezone '{timezone}'. Use a name like Asia/Singapore or Europe/London.")
+        return
+
+    async with get_db() as db:
+        try:
+            await crud.upsert_digest_subscription(db, context.user_data["id"], delivery_time, timezone)
+        except Exception as e:
+            logging.error(e)
+            await update.message.reply_text(f"Error occurred when saving your digest. {err_fn.handle_data_mutation_error(e)}")
+            return
+    await update.message.reply_text(f"You will receive news for all your saved topics and queries every day at {delivery_time.strftime('%H:%M')} ({timezone}).")
+
+async def unsubscribe_digest(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async with get_db() as db:
+        try:
+            deleted = await crud.delete_digest_subscription(db, context.user_data["id"])
+        except Exception as e:
+            logging.error(e)
+            await update.message.reply_text(f"Error occurred when removing your digest. {err_fn.handle_data_mutation_error(e)}")
+            return
+    await update.message.reply_text("Daily digest cancelled." if deleted else "You are not subscribed to a daily digest.")
+
+async def subscribe_alerts(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async with get_db() as db:
+        try:
+            created = await crud.create_alert_subscription(db, context.user_data["id"])
+        except Exception as e:
+            logging.error(e)
+            await update.message.reply_text(f"Error occurred when saving your alerts. {err_fn.handle_data_mutation_error(e)}")
+            return
+    request_reload()
+    if created:
+        await update.message.reply_text("You will be alerted when breaking news matches one of your saved queries.")
+    else:
+        await update.message.reply_text("You are already subscribed to breaking news alerts.")
+
+async def unsubscribe_alerts(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async with get_db() as db:
+        try:
+            deleted = await crud.delete_alert_subscription(db, context.user_data["id"])
+        except Exception as e:
+            logging.error(e)
+            await update.message.reply_text(f"Error occurred when removing your alerts. {err_fn.handle_data_mutation_error(e)}")
+            return
+    request_reload()
+    await update.message.reply_text("Breaking news alerts cancelled." if deleted else "You are not subscribed to breaking news alerts.")
+
+
 async def send_help_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_markdown_v2(help_message)
     # Message with a clickable link (HTML format)
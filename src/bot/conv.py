@@ -4,6 +4,7 @@ from telegram import ReplyKeyboardMarkup, Update, InlineKeyboardButton, InlineKe
 from src.utils.constants import countries_available,PUBLIC_TOPICS, country_keyboard
 from . import bot_functions as bf
 import src.bot.states as bot_states
+from src.bot.alerts import request_reload
 import src.utils.helper_functions as hf
 from src.database.database import get_db
 import src.database.crud as crud
@@ -261,6 +262,7 @@ async def add_saved_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
             logging.error(e)
             await update.message.reply_text(f"Error occurred when adding query. {err_fn.handle_data_mutation_error(e)}. Exitting the session.")  
             return ConversationHandler.END
+    request_reload()
     await update.message.reply_text("Query added successfully. Here is the updated saved queries...")
     await bf.display_user_queries(update, context)
     return ConversationHandler.END
@@ -279,6 +281,7 @@ async def delete_saved_query(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await query.edit_message_text(f"Error occurred when deleting query. {err_fn.handle_data_mutation_error(e)} Exiting the session...")
             return ConversationHandler.END
 
+    request_reload()
     await query.edit_message_text("Query deleted successfully.")
     await update.message.reply_text("Here is the updated saved queries...")
     await bf.display_user_queries(update, context)
@@ -296,6 +299,7 @@ async def clear_queries_confirm(update: Update, context: ContextTypes.DEFAULT_TY
                 logging.error(e)
                 await update.message.reply_text(f"Error occurred when clearing topics. {err_fn.handle_data_mutation_error(e)} Exiting the session.")
                 return ConversationHandler.END
+        request_reload()
         await update.message.reply_text("All queries cleared.")
         return ConversationHandler.END
     else:
@@ -320,7 +324,7 @@ edit_saved_queries_conv_handler = ConversationHandler(
 
 # Function to start the /topic_news conversation
 async def start_topic_news(update: Update, context:ContextTypes.DEFAULT_TYPE):
-    # flags that can be used: c (to choose if u want to choose what topic to send), f (to choose how many days to filter by for news)
+    # flags that can be used: c (to choose if u want to choose what topic to send), f (to choose how many days to filter by for news), n (only news not sent before)
     filter_num_days = 0
     async with get_db() as db:
         user_id = context.user_data["id"]
@@ -331,7 +335,7 @@ async def start_topic_news(update: Update, context:ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text(f"Error occurred when fetching topics. {err_fn.handle_data_mutation_error(e)} Exiting session")
             return ConversationHandler.END
     
-    extracted_flags = hf.extract_flags(update.message.text, ["c", "f"])
+    extracted_flags = hf.extract_flags(update.message.text, ["c", "f", "n", "d"])
     if "f" in extracted_flags:
         try:
             filter_num_days = max(int(extracted_flags["f"]), 0) # cap it to filter by 1 day
@@ -341,13 +345,19 @@ async def start_topic_news(update: Update, context:ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text(f"{extracted_flags['r']} is not a valid number for the -f flag. Try inputting correctly.")
             return ConversationHandler.END
     context.user_data["filter_num_days"] = filter_num_days
+    context.user_data["only_new"] = "n" in extracted_flags
     if "c" not in extracted_flags:
         if not user_topics:
             await update.message.reply_text("You have no saved topics. Please enter a custom topic name")
             return bot_states.SendTopicNews.INPUT_CUSTOM_TOPIC_NAME
-        await update.message.reply_text("Fetching news for all saved topics...")
+        context.user_data["combined"] = "d" in extracted_flags
+        if not context.user_data["combined"]:
+            # The combined digest reports its own progress
+            await update.message.reply_text("Fetching news for all saved topics...")
         await bf.send_all_topic_news(update, context, user_topics)
         context.user_data.pop("filter_num_days", None)
+        context.user_data.pop("only_new", None)
+        context.user_data.pop("combined", None)
         return ConversationHandler.END
     
     keyboard = []
@@ -381,6 +391,7 @@ async def select_saved_topics(update: Update, context:ContextTypes.DEFAULT_TYPE)
         await query.edit_message_text(text="Good choice!")
         await bf.send_topic_news(update, context, topic_selected.topic_name, topic_selected.topic_hash, topic_selected.country_code)
         context.user_data.pop("filter_num_days", None)
+        context.user_data.pop("only_new", None)
         return ConversationHandler.END
 
 # Function to handle custom topic name input
@@ -474,7 +485,10 @@ send_topic_news_conv_handler = ConversationHandler(
 
 # Function to start the /query_news conversation
 async def start_query_news(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    flags = hf.extract_flags(update.message.text, ["c"])
+    flags = hf.extract_flags(update.message.text, ["c", "n", "l", "d"])
+    context.user_data["only_new"] = "n" in flags
+    context.user_data["local_first"] = "l" in flags
+    context.user_data["combined"] = "d" in flags
     # default will be when = "1d"  
     async with get_db() as db:
         user_id = context.user_data.get("id")
@@ -657,6 +671,7 @@ async def confirm_save_query(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 logging.error(f"Error saving queries: {e}")
                 await query.edit_message_text("Failed to save your queries. Please try again later.")
                 return ConversationHandler.END
+        request_reload()
         await query.edit_message_text("Your queries have been saved!")
     else:
         await query.edit_message_text("Your queries were not saved.")
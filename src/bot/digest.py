@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from zoneinfo import ZoneInfo
+from telegram import Bot
+from src.database.database import get_db
+import src.database.crud as crud
+import src.utils.scraping_functions as sf
+import src.utils.helper_functions as hf
+from src.bot.file_id_store import file_id_store
+from src.utils.render_service import render_service
+from src.utils.coalesce import canonical_query, canonical_topic_hash
+from src.utils.constants import DIGEST_CHECK_INTERVAL_SECONDS, DIGEST_CATCH_UP_MINUTES
+
+# Scheduled digests: every DIGEST_CHECK_INTERVAL_SECONDS, collect the subscribers whose delivery time has come,
+# group all their saved topics and queries by unique feed, fetch and render each feed once and fan the PDF out.
+
+# Feeds already delivered per (subscription id, local date of the digest), so a digest retried after a failed send
+# only sends what is missing
+_delivered_feeds = defaultdict(set)
+
+def due_subscriptions(rows, now_utc: datetime):
+    """
+    Return (subscription, tele_id, local_date) for subscriptions whose delivery time passed less than DIGEST_CATCH_UP_MINUTES
+    ago, local_date being the day of that delivery time: a digest due at 23:50 is still sent at 00:10 the next day.
+    """
+    due = []
+    for subscription, tele_id in rows:
+        local_now = now_utc.astimezone(ZoneInfo(subscription.timezone))
+        for local_date in (local_now.date(), local_now.date() - timedelta(days=1)):
+            scheduled = datetime.combine(local_date, subscription.delivery_time, tzinfo=local_now.tzinfo)
+            if subscription.last_sent_on == local_date:
+                continue
+            if scheduled <= local_now < scheduled + timedelta(minutes=DIGEST_CATCH_UP_MINUTES):
+                due.append((subscription, tele_id, local_date))
+                break
+    return due
+
+def group_by_feed(topics, queries, tele_id_by_user: dict):
+    """
+    Map each distinct feed to the spec fetching it and its subscribers, as tele_id -> (title, filename) in that
+    subscriber's own words: a topic saved as "AI" by one user and "Machine learning" by another is fetched once,
+    and each gets a document named after their own label.
+    Feeds are keyed by (canonical topic hash, country) for topics and by the canonical query for queries.
+    """
+    feeds = {}
+    for topic in topics:
+        topic_hash = canonical_topic_hash(topic.topic_hash)
+        key = ('topic', topic_hash, topic.country_code)
+        if key not in feeds:
+            feeds[key] = {'spec': sf.topic_spec(topic.topic_name, topic_hash, topic.country_code, filter_num_days=1), 'subscribers': {}}
+        feeds[key]['subscribers'].setdefault(tele_id_by_user[topic.user_id], (f"{topic.topic_name.upper()} ({topic.country_code})",
+                                                                                f"{topic.topic_name}_{topic.country_code}_news.pdf"))
+    for user_query in queries:
+        key = ('query', canonical_query(user_query.query))
+        query = user_query.query.strip()
+        if key not in feeds:
+            feeds[key] = {'spec': sf.query_spec(query, when='1d'), 'subscribers': {}}
+        feeds[key]['subscribers'].setdefault(tele_id_by_user[user_query.user_id], (query, f"{query}_1d_news.pdf"))
+    return feeds
+
+async def deliver_due_digests(bot: Bot) -> int:
+    """Send every due digest, returns the number of subscribers served"""
+    async with get_db() as db:
+        rows = await crud.get_digest_subscriptions_with_tele_id(db)
+        due = due_subscriptions(rows, datetime.now(timezone.utc))
+        if not due:
+            return 0
+        user_ids = [subscription.user_id for subscription, _, _ in due]
+        topics = await crud.get_topic_preferences_by_users(db, user_ids)
+        queries = await crud.get_user_queries_by_users(db, user_ids)
+
+    tele_id_by_user = {subscription.user_id: tele_id for subscription, tele_id, _ in due}
+    digest_by_tele_id = {tele_id: (subscription.id, local_date) for subscription, tele_id, local_date in due}
+    for digest in list(_delivered_feeds):
+        if digest not in digest_by_tele_id.values():
+            del _delivered_feeds[digest]  # sent, or its catch-up window is over
+    feeds = group_by_feed(topics, queries, tele_id_by_user)
+    # Leave out the feeds an earlier, partly failed run already delivered
+    for key, feed in list(feeds.items()):
+        feed['subscribers'] = {tele_id: label for tele_id, label in feed['subscribers'].items() if key not in _delivered_feeds[digest_by_tele_id[tele_id]]}
+        if not feed['subscribers']:
+            del feeds[key]
+    started = time.perf_counter()
+
+    recipients = set().union(*(feed['subscribers'] for feed in feeds.values())) if feeds else set()
+    for tele_id in recipients:
+        if _delivered_feeds[digest_by_tele_id[tele_id]]:
+            continue  # already introduced by the earlier run
+        try:
+            await bot.send_message(chat_id=tele_id, text="Here is your daily news digest...")
+        except Exception as e:
+            logging.warning(f"Could not start digest for {tele_id}: {e}")
+
+    key_by_spec = {id(feed['spec']): key for key, feed in feeds.items()}
+    current_date = hf.get_current_date()
+    uploads = 0
+    failed = set()  # tele_ids missing at least one document, retried on the next run within the catch-up window
+    async for spec, news, error in sf.fetch_many([feed['spec'] for feed in feeds.values()]):
+        key = key_by_spec[id(spec)]
+        feed = feeds[key]
+        if error:
+            logging.warning(f"Digest feed {spec.label} failed: {error}")
+            failed.update(feed['subscribers'])
+            continue
+        if not news:
+            continue
+        by_label = defaultdict(list)
+        for tele_id, label in feed['subscribers'].items():
+            by_label[label].append(tele_id)
+        for (title, filename), tele_ids in by_label.items():
+            # Fetched once per feed, rendered once per label and sent to every subscriber using it
+            try:
+                pdf_bytes = await render_service.render(news, title)
+            except Exception as e:
+                logging.warning(f"Could not render digest {title}: {e}")
+                failed.update(tele_ids)
+                continue
+            for tele_id in tele_ids:
+                try:
+                    # Uploaded for the first subscriber, sent by file_id to the others
+                    await file_id_store.send(partial(bot.send_document, tele_id), pdf_bytes, f"{current_date}_{filename}")
+                    uploads += 1
+                    _delivered_feeds[digest_by_tele_id[tele_id]].add(key)
+                except Exception as e:
+                    logging.warning(f"Could not send digest {title} to {tele_id}: {e}")
+                    failed.add(tele_id)
+
+    # Only digests sent in full are marked, the others are retried until DIGEST_CATCH_UP_MINUTES have passed
+    sent_on = defaultdict(list)
+    for subscription, tele_id, local_date in due:
+        if tele_id not in failed:
+            sent_on[local_date].append(subscription.id)
+            _delivered_feeds.pop((subscription.id, local_date), None)
+    if sent_on:
+        async with get_db() as db:
+            for local_date, subscription_ids in sent_on.items():
+                await crud.mark_digests_sent(db, subscription_ids, local_date)
+
+    served = sum(map(len, sent_on.values()))
+    logging.info(f"Digests: {len(due)} due, {served} sent, {len(due) - served} to retry, {len(feeds)} distinct feeds, {uploads} documents sent in {time.perf_counter() - started:.1f}s")
+    return served
+
+async def run_digest_scheduler(bot: Bot):
+    while True:
+        try:
+            await deliver_due_digests(bot)
+        except Exception as e:
+            logging.error(f"Digest delivery failed: {e}")
+        # Wake up on the next interval boundary
+        await asyncio.sleep(DIGEST_CHECK_INTERVAL_SECONDS - time.time() % DIGEST_CHECK_INTERVAL_SECONDS)
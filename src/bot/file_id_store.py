@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from hashlib import blake2b
+from telegram import InputFile, Message
+from telegram.error import BadRequest
+from src.utils.constants import FILE_ID_STORE_SIZE
+
+# Telegram keeps every uploaded document and returns a file_id for it, which can be sent again to any chat without
+# uploading the bytes. Documents are keyed by a hash of their content and filename (a document sent by file_id keeps
+# the name it was uploaded with), so a digest or /top_news PDF is uploaded once and then only referenced.
+
+
+def _document_key(content: bytes, filename: str) -> str:
+    return blake2b(content, digest_size=20, person=b'tg-document').hexdigest() + ':' + filename
+
+
+# Telegram's answers to a file_id it no longer accepts. Other errors mentioning files ("file is too big",
+# "file must be non-empty") would fail the same way on a fresh upload.
+_STALE_FILE_ID_ERRORS = ("wrong file identifier", "wrong remote file identifier", "file reference expired")
+
+
+def _is_stale_file_id(error: BadRequest) -> bool:
+    message = error.message.lower()
+    return any(stale in message for stale in _STALE_FILE_ID_ERRORS)
+
+
+class FileIdStore:
+    """LRU of document hash -> file_id of the first upload, an entry is dropped when Telegram rejects the id"""
+
+    def __init__(self, max_size = FILE_ID_STORE_SIZE):
+        self.max_size = max_size
+        self._file_ids = OrderedDict()
+        self._uploading = {}  # key -> future of the file_id of an upload in progress
+        self._stats = {"uploads": 0, "reused": 0, "invalidated": 0, "bytes_uploaded": 0, "bytes_saved": 0}
+
+    def _remember(self, key: str, file_id: str):
+        self._file_ids[key] = file_id
+        self._file_ids.move_to_end(key)
+        while len(self._file_ids) > self.max_size:
+            self._file_ids.popitem(last=False)
+
+    async def send(self, send_document, content: bytes, filename: str) -> Message:
+        """
+        Send a document through `send_document(document)` (e.g. message.reply_document or a bot.send_document partial),
+        by file_id when this content was uploaded before, uploading it otherwise.
+        """
+        key = _document_key(content, filename)
+        uploading = self._uploading.get(key)
+        if uploading is not None:
+            # Same document uploading for another chat right now, reuse its file_id once it is known
+            await asyncio.wait([uploading])
+        file_id = self._file_ids.get(key)
+        if file_id is not None:
+            self._file_ids.move_to_end(key)
+            try:
+                message = await send_document(file_id)
+                self._stats["reused"] += 1
+                self._stats["bytes_saved"] += len(content)
+                return message
+            except BadRequest as e:
+                if not _is_stale_file_id(e):
+                    raise
+                logging.info(f"Telegram rejected the file_id of {filename}, uploading it again: {e.message}")
+                self._stats["invalidated"] += 1
+                if self._file_ids.get(key) == file_id:
+                    del self._file_ids[key]
+        return await self._upload(key, send_document, content, filename)
+
+    async def _upload(self, key: str, send_document, content: bytes, filename: str) -> Message:
+        future = asyncio.get_running_loop().create_future()
+        self._uploading.setdefault(key, future)
+        try:
+            message = await send_document(InputFile(content, filename=filename))
+        finally:
+            if self._uploading.get(key) is future:
+                del self._uploading[key]
+            future.set_result(None)
+        self._stats["uploads"] += 1
+        self._stats["bytes_uploaded"] += len(content)
+        if message.document:
+            self._remember(key, message.document.file_id)
+        return message
+
+    def stats(self):
+        return {**self._stats, "file_ids": len(self._file_ids), "uploading": len(self._uploading)}
+
+
+file_id_store = FileIdStore()
@@ -1,7 +1,11 @@
+from sqlalchemy import func, update, and_, or_, not_, literal_column
 from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
-from .models import User, TopicPreference, UserQuery
+from datetime import date, time, datetime
+import uuid
+from .models import User, TopicPreference, UserQuery, DigestSubscription, AlertSubscription, SeenArticles, StoredArticle, ArticleFeed, FeedCoverage
 
 
 # ---------------------- User CRUD ----------------------
@@ -70,6 +74,11 @@ async def get_topic_preference_by_user_and_hash(db: AsyncSession, user_id: UUID,
     
     return topic_preference
 
+# Retrieve the topic preferences of several users at once
+async def get_topic_preferences_by_users(db: AsyncSession, user_ids: list[UUID]) -> list[TopicPreference]:
+    result = await db.execute(select(TopicPreference).filter(TopicPreference.user_id.in_(user_ids)))
+    return result.scalars().all()
+
 # Delete a topic preference
 async def delete_topic_preference(db: AsyncSession, topic_id: UUID) -> None:
     topic = await db.execute(select(TopicPreference).filter(TopicPreference.id == topic_id))
@@ -96,6 +105,17 @@ async def is_topic_name_existing(db: AsyncSession, user_id: UUID, topic_name: st
     topic_preference = result.scalars().first()
     return topic_preference is not None
 
+# Retrieve the (topic_hash, country_code) pairs saved by the most users, most saved first
+async def get_most_saved_topics(db: AsyncSession, limit: int = 50) -> list[tuple[str, str, int]]:
+    saves = func.count(TopicPreference.id).label("saves")
+    result = await db.execute(
+        select(TopicPreference.topic_hash, TopicPreference.country_code, saves)
+        .group_by(TopicPreference.topic_hash, TopicPreference.country_code)
+        .order_by(saves.desc())
+        .limit(limit)
+    )
+    return [tuple(row) for row in result.all()]
+
 # ------------------ UserQuery CRUD ------------------
 
 # Create a new user query
@@ -115,6 +135,11 @@ async def get_user_queries_by_user(db: AsyncSession, user_id: UUID) -> list[User
     result = await db.execute(select(UserQuery).filter(UserQuery.user_id == user_id))
     return result.scalars().all()
 
+# Retrieve the queries of several users at once
+async def get_user_queries_by_users(db: AsyncSession, user_ids: list[UUID]) -> list[UserQuery]:
+    result = await db.execute(select(UserQuery).filter(UserQuery.user_id.in_(user_ids)))
+    return result.scalars().all()
+
 # Delete a user query
 async def delete_user_query(db: AsyncSession, query_id: UUID) -> None:
     query = await db.execute(select(UserQuery).filter(UserQuery.id == query_id))
@@ -122,3 +147,159 @@ async def delete_user_query(db: AsyncSession, query_id: UUID) -> None:
     if query:
         await db.delete(query)
         await db.commit()
+
+
+# ------------------ DigestSubscription CRUD ------------------
+
+# Create or update the digest subscription of a user
+async def upsert_digest_subscription(db: AsyncSession, user_id: UUID, delivery_time: time, timezone: str) -> DigestSubscription:
+    result = await db.execute(select(DigestSubscription).filter(DigestSubscription.user_id == user_id))
+    subscription = result.scalars().first()
+    if subscription:
+        subscription.delivery_time = delivery_time
+        subscription.timezone = timezone
+    else:
+        subscription = DigestSubscription(user_id=user_id, delivery_time=delivery_time, timezone=timezone)
+        db.add(subscription)
+    await db.commit()
+    await db.refresh(subscription)
+    return subscription
+
+# Delete the digest subscription of a user, returns whether there was one
+async def delete_digest_subscription(db: AsyncSession, user_id: UUID) -> bool:
+    result = await db.execute(select(DigestSubscription).filter(DigestSubscription.user_id == user_id))
+    subscription = result.scalars().first()
+    if subscription:
+        await db.delete(subscription)
+        await db.commit()
+    return subscription is not None
+
+# Retrieve every subscription together with the subscriber's tele_id
+async def get_digest_subscriptions_with_tele_id(db: AsyncSession) -> list[tuple[DigestSubscription, str]]:
+    result = await db.execute(select(DigestSubscription, User.tele_id).join(User, User.id == DigestSubscription.user_id))
+    return [tuple(row) for row in result.all()]
+
+# Record that digests were delivered for the given local date
+async def mark_digests_sent(db: AsyncSession, subscription_ids: list[UUID], sent_on: date) -> None:
+    await db.execute(update(DigestSubscription).where(DigestSubscription.id.in_(subscription_ids)).values(last_sent_on=sent_on))
+    await db.commit()
+
+
+# ------------------ AlertSubscription CRUD ------------------
+
+# Subscribe a user to breaking-news alerts, returns whether they were not subscribed yet
+async def create_alert_subscription(db: AsyncSession, user_id: UUID) -> bool:
+    result = await db.execute(select(AlertSubscription).filter(AlertSubscription.user_id == user_id))
+    if result.scalars().first():
+        return False
+    db.add(AlertSubscription(user_id=user_id))
+    await db.commit()
+    return True
+
+# Delete the alert subscription of a user, returns whether there was one
+async def delete_alert_subscription(db: AsyncSession, user_id: UUID) -> bool:
+    result = await db.execute(select(AlertSubscription).filter(AlertSubscription.user_id == user_id))
+    subscription = result.scalars().first()
+    if subscription:
+        await db.delete(subscription)
+        await db.commit()
+    return subscription is not None
+
+# Retrieve (user_id, tele_id, query) for every saved query of the users subscribed to alerts
+async def get_alert_queries_with_tele_id(db: AsyncSession) -> list[tuple[UUID, str, str]]:
+    result = await db.execute(select(UserQuery.user_id, User.tele_id, UserQuery.query)
+                              .join(AlertSubscription, AlertSubscription.user_id == UserQuery.user_id)
+                              .join(User, User.id == UserQuery.user_id)
+                              .order_by(UserQuery.user_id, UserQuery.query))
+    return [tuple(row) for row in result.all()]
+
+
+# ------------------ SeenArticles CRUD ------------------
+
+# Retrieve the serialised seen-articles filter of a user, None if nothing was delivered yet
+async def get_seen_articles_bloom(db: AsyncSession, user_id: UUID) -> bytes | None:
+    result = await db.execute(select(SeenArticles.bloom).filter(SeenArticles.user_id == user_id))
+    return result.scalars().first()
+
+# Create or replace the serialised seen-articles filter of a user
+async def upsert_seen_articles_bloom(db: AsyncSession, user_id: UUID, bloom: bytes) -> None:
+    result = await db.execute(select(SeenArticles).filter(SeenArticles.user_id == user_id))
+    seen = result.scalars().first()
+    if seen:
+        seen.bloom = bloom
+    else:
+        db.add(SeenArticles(user_id=user_id, bloom=bloom))
+    await db.commit()
+
+
+# ------------------ Article store CRUD ------------------
+
+# Insert new articles or refresh existing ones (matched on url_hash) and link all of them to feed_key, in one transaction
+async def upsert_articles(db: AsyncSession, feed_key: str, articles: list[dict], chunk_size: int = 500) -> int:
+    unique_articles = list({article["url_hash"]: article for article in articles}.values())
+    for start in range(0, len(unique_articles), chunk_size):
+        chunk = [{"id": uuid.uuid4(), **article} for article in unique_articles[start:start + chunk_size]]
+        statement = insert(StoredArticle).values(chunk)
+        statement = statement.on_conflict_do_update(
+            index_elements=[StoredArticle.url_hash],
+            set_={column: statement.excluded[column] for column in ("title", "publisher", "published_at", "summary")},
+        ).returning(StoredArticle.id)
+        article_ids = (await db.execute(statement)).scalars().all()
+        links = insert(ArticleFeed).values([{"article_id": article_id, "feed_key": feed_key} for article_id in article_ids])
+        await db.execute(links.on_conflict_do_update(index_elements=[ArticleFeed.article_id, ArticleFeed.feed_key], set_={"seen_at": func.now()}))
+    await db.commit()
+    return len(unique_articles)
+
+# Record that the search behind feed_key was fetched for the [covered_from, covered_to] window, whole days [range_from, range_to)
+async def add_feed_coverage(db: AsyncSession, feed_key: str, range_from: date, range_to: date, covered_from: datetime, covered_to: datetime, article_count: int) -> None:
+    db.add(FeedCoverage(feed_key=feed_key, range_from=range_from, range_to=range_to, covered_from=covered_from, covered_to=covered_to, article_count=article_count))
+    await db.commit()
+
+# Retrieve the coverage records of feed_key whose window contains [range_from, range_to]
+async def get_feed_coverage(db: AsyncSession, feed_key: str, range_from: date, range_to: date) -> list[FeedCoverage]:
+    result = await db.execute(
+        select(FeedCoverage)
+        .filter(FeedCoverage.feed_key == feed_key, FeedCoverage.range_from <= range_from, FeedCoverage.range_to >= range_to)
+        .order_by(FeedCoverage.fetched_at.desc())
+    )
+    return result.scalars().all()
+
+# Retrieve the stored articles seen in feed_key and published in [start, end)
+async def get_articles_by_feed(db: AsyncSession, feed_key: str, start: datetime, end: datetime) -> list[StoredArticle]:
+    result = await db.execute(
+        select(StoredArticle)
+        .join(ArticleFeed, ArticleFeed.article_id == StoredArticle.id)
+        .filter(ArticleFeed.feed_key == feed_key, StoredArticle.published_at >= start, StoredArticle.published_at < end)
+    )
+    return result.scalars().all()
+
+# Retrieve the coverage records of feed_key whose exact window contains [start, end]
+async def get_feed_window_coverage(db: AsyncSession, feed_key: str, start: datetime, end: datetime) -> list[FeedCoverage]:
+    result = await db.execute(
+        select(FeedCoverage)
+        .filter(FeedCoverage.feed_key == feed_key, FeedCoverage.covered_from <= start, FeedCoverage.covered_to >= end)
+        .order_by(FeedCoverage.fetched_at.desc())
+    )
+    return result.scalars().all()
+
+# Text search configuration of the articles.search_vector column
+_ENGLISH = literal_column("'english'::regconfig")
+
+# Full-text search over all stored articles published in [start, end), newest first
+# text goes through websearch_to_tsquery, sites / titles are regexes on publisher_url and phrases that must be in the headline
+async def search_articles(db: AsyncSession, text: str, site_patterns: list[str], excluded_site_patterns: list[str],
+                          titles: list[str], excluded_titles: list[str], start: datetime, end: datetime, limit: int) -> list[StoredArticle]:
+    conditions = [StoredArticle.published_at >= start, StoredArticle.published_at < end]
+    if text:
+        conditions.append(StoredArticle.search_vector.op('@@')(func.websearch_to_tsquery(_ENGLISH, text)))
+    if site_patterns:
+        conditions.append(or_(*(StoredArticle.publisher_url.op('~*')(pattern) for pattern in site_patterns)))
+    for pattern in excluded_site_patterns:
+        conditions.append(or_(StoredArticle.publisher_url.is_(None), not_(StoredArticle.publisher_url.op('~*')(pattern))))
+    title_vector = func.to_tsvector(_ENGLISH, StoredArticle.title)
+    for title in titles:
+        conditions.append(title_vector.op('@@')(func.phraseto_tsquery(_ENGLISH, title)))
+    for title in excluded_titles:
+        conditions.append(not_(title_vector.op('@@')(func.phraseto_tsquery(_ENGLISH, title))))
+    result = await db.execute(select(StoredArticle).filter(and_(*conditions)).order_by(StoredArticle.published_at.desc()).limit(limit))
+    return result.scalars().all()
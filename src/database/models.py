@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, ForeignKey
+from sqlalchemy import Column, String, ForeignKey, Time, Date, DateTime, LargeBinary, Integer, Index, Computed, func
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from .database import Base
@@ -28,3 +29,72 @@ class UserQuery(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
     query = Column(String, nullable=False)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
+
+
+class DigestSubscription(Base):
+    __tablename__ = "digestSubscriptions"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), unique=True, nullable=False)
+    delivery_time = Column(Time, nullable=False)  # local time of day in `timezone`
+    timezone = Column(String, nullable=False, default="UTC")  # IANA name, e.g. Asia/Singapore
+    last_sent_on = Column(Date, nullable=True)  # local date of the last delivered digest
+
+
+class AlertSubscription(Base):
+    __tablename__ = "alertSubscriptions"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), unique=True, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class SeenArticles(Base):
+    __tablename__ = "seenArticles"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), unique=True, nullable=False)
+    bloom = Column(LargeBinary, nullable=False)  # serialised RotatingBloomFilter of the articles delivered to the user
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+
+
+class StoredArticle(Base):
+    __tablename__ = "articles"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
+    url_hash = Column(String(32), unique=True, nullable=False)  # blake2b-128 of the link, hex
+    link = Column(String, nullable=False)
+    title = Column(String, nullable=False)
+    publisher = Column(String, nullable=True)
+    publisher_url = Column(String, nullable=True)  # matched by site: in local searches
+    published_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    summary = Column(String, nullable=True)  # description HTML holding the related coverage
+    first_seen_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # Full-text index over the headline and publisher, kept up to date by Postgres
+    search_vector = Column(TSVECTOR, Computed("to_tsvector('english', title || ' ' || coalesce(publisher, ''))", persisted=True))
+
+    __table_args__ = (Index('ix_articles_search_vector', 'search_vector', postgresql_using='gin'),)
+
+
+class ArticleFeed(Base):
+    __tablename__ = "articleFeeds"
+
+    article_id = Column(UUID(as_uuid=True), ForeignKey('articles.id', ondelete='CASCADE'), primary_key=True)
+    feed_key = Column(String, primary_key=True)  # e.g. query:<canonical query>:US:en, see article_store.feed_key_for_url
+    seen_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (Index('ix_articleFeeds_feed_key', 'feed_key'),)
+
+
+class FeedCoverage(Base):
+    __tablename__ = "feedCoverage"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
+    feed_key = Column(String, nullable=False, index=True)
+    range_from = Column(Date, nullable=False)  # after: date of the fetched search
+    range_to = Column(Date, nullable=False)  # before: date of the fetched search
+    # Exact window the fetch covered: midnights of after:/before:, or [fetch time - when:, fetch time]
+    covered_from = Column(DateTime(timezone=True), nullable=False)
+    covered_to = Column(DateTime(timezone=True), nullable=False)
+    article_count = Column(Integer, nullable=False)
+    fetched_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
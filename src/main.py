@@ -1,14 +1,29 @@
+import asyncio
 from contextlib import asynccontextmanager
 from http import HTTPStatus
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, ApplicationHandlerStop, filters
 from telegram.ext._contexttypes import ContextTypes
 from fastapi import FastAPI, Request, Response
-from pyngrok import ngrok
 import os
 import re
 from dotenv import load_dotenv
+# Load .env before importing src modules, some of them read their configuration at import time
+load_dotenv()
 from src.utils import scraping_functions as sf
+from src.pygooglenews import close_http_clients
+from src.utils.feed_cache import feed_cache
+from src.utils.rate_limiter import rate_limiter
+from src.utils.egress_pool import egress_pool
+from src.utils.coalesce import coalescer
+from src.utils.article_store import article_store
+from src.utils.seen_store import seen_store
+from src.utils.render_service import render_service
+from src.utils.startup import readiness, is_ready, warm_up, prime_database
+from src.utils.prefetch import run_prefetch_scheduler
+from src.bot.digest import run_digest_scheduler
+import src.bot.alerts as alerts
+from src.bot.file_id_store import file_id_store
 from src.utils.constants import parse_command_for_args_pattern
 import src.bot.conv as bot_conv
 import src.bot.bot_functions as bf
@@ -16,19 +31,31 @@ from src.database.database import get_db
 import src.database.crud as crud
 import logging
 import src.utils.errors as err_fn
-load_dotenv()
 # uvicorn src.main:app --host 0.0.0.0 --port 8000 --reload
 
 CODE_ENV = os.getenv('CODE_ENV')
 BOT_TOKEN = os.getenv('LOCAL_BOT_TOKEN') if CODE_ENV == 'dev' else os.getenv('PROD_BOT_TOKEN')
+# How updates reach the bot: 'ngrok' (tunnel to this server), 'webhook' (WEBHOOK_URL already points here) or 'polling'
+BOT_DELIVERY = os.getenv('BOT_DELIVERY', 'ngrok')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+# Keep popular feeds warm in the feed cache from a background task
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'true').lower() != 'false'
+# Push scheduled digests to subscribed users
+DIGESTS_ENABLED = os.getenv('DIGESTS_ENABLED', 'true').lower() != 'false'
+# Percolate newly fetched articles through the saved queries of users subscribed to alerts
+ALERTS_ENABLED = os.getenv('ALERTS_ENABLED', 'true').lower() != 'false'
+# Keep every fetched article in the database and answer past from/to searches from it
+article_store.enabled = os.getenv('ARTICLE_STORE_ENABLED', 'true').lower() != 'false'
 
-ptb = (
-    Application.builder().updater(None)
+ptb_builder = (
+    Application.builder()
     .token(BOT_TOKEN)
     .read_timeout(15)
     .get_updates_read_timeout(42)
-    .build()
 )
+if BOT_DELIVERY != 'polling':
+    ptb_builder = ptb_builder.updater(None)
+ptb = ptb_builder.build()
 
 print("Initialised python telegram bot")
 
@@ -37,26 +64,59 @@ if CODE_ENV == 'dev':
 else:
     print("Running in production mode")
 
-    
-ngrok_auth_token = os.getenv('NGROK_AUTH_TOKEN')
-ngrok.set_auth_token(ngrok_auth_token)
-http_tunnel = ngrok.connect(8000)
-PUBLIC_URL = http_tunnel.public_url
-print("Obtained public URL: " + PUBLIC_URL)
+
+def open_ngrok_tunnel() -> str:
+    from pyngrok import ngrok  # only needed in ngrok mode, and slow to import
+    ngrok.set_auth_token(os.getenv('NGROK_AUTH_TOKEN'))
+    http_tunnel = ngrok.connect(8000)
+    print("Obtained public URL: " + http_tunnel.public_url)
+    return http_tunnel.public_url
+
+async def start_delivery():
+    if BOT_DELIVERY == 'polling':
+        await ptb.updater.start_polling()
+    else:
+        public_url = WEBHOOK_URL if BOT_DELIVERY == 'webhook' else await asyncio.to_thread(open_ngrok_tunnel)
+        await ptb.bot.setWebhook(public_url)
+    print(f"Receiving updates via {BOT_DELIVERY}")
+    readiness["delivery"] = True
+
+def log_task_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(f"Startup task failed: {task.exception()}")
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
-    await ptb.bot.setWebhook(PUBLIC_URL)
     async with ptb:
         await ptb.start()
         print("bot started...")
+        # Tunnel, DB pool and warm-up run in the background so /healthz answers straight away
+        startup_tasks = [asyncio.create_task(coro) for coro in (start_delivery(), prime_database(), warm_up(), render_service.start(), seen_store.run_flusher())]
+        if PREFETCH_ENABLED:
+            startup_tasks.append(asyncio.create_task(run_prefetch_scheduler()))
+        else:
+            readiness["caches"] = True
+        if DIGESTS_ENABLED:
+            startup_tasks.append(asyncio.create_task(run_digest_scheduler(ptb.bot)))
+        if ALERTS_ENABLED:
+            startup_tasks.append(asyncio.create_task(alerts.run_alert_dispatcher(ptb.bot)))
+        for task in startup_tasks:
+            task.add_done_callback(log_task_failure)
         try:
             yield
         except Exception as e: 
             print(f"Runtime error occured {e}")
         finally: 
             print("bot stopping...")
+            for task in startup_tasks:
+                task.cancel()
+            if ptb.updater and ptb.updater.running:
+                await ptb.updater.stop()
             await ptb.stop()
+            await article_store.flush()
+            await seen_store.flush()
+            render_service.shutdown()
+            await close_http_clients()
 
 app = FastAPI(lifespan = lifespan)
 
@@ -67,6 +127,20 @@ async def process_update(request: Request):
     await ptb.process_update(update)
     return Response(status_code = HTTPStatus.OK)
 
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz(response: Response):
+    if not is_ready():
+        response.status_code = HTTPStatus.SERVICE_UNAVAILABLE
+    return {"ready": is_ready(), **readiness}
+
+@app.get("/stats")
+async def stats():
+    return {"feed_cache": feed_cache.stats(), "rate_limiter": rate_limiter.stats(), "egress_pool": egress_pool.stats(), "coalescer": coalescer.stats(), "article_store": article_store.stats(), "render_service": render_service.stats(), "file_id_store": file_id_store.stats(), "alerts": alerts.stats()}
+
 # /start
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a message when the command /start is issued."""
@@ -131,4 +205,8 @@ ptb.add_handler(CommandHandler("display_user_queries", bf.display_user_queries),
 ptb.add_handler(bot_conv.edit_saved_queries_conv_handler, group=1) # /edit_saved_queries
 ptb.add_handler(bot_conv.send_topic_news_conv_handler, group=1) # /send_topic_news
 ptb.add_handler(bot_conv.query_news_conv_handler, group=1)
+ptb.add_handler(CommandHandler("subscribe_digest", bf.subscribe_digest), group=1)
+ptb.add_handler(CommandHandler("unsubscribe_digest", bf.unsubscribe_digest), group=1)
+ptb.add_handler(CommandHandler("subscribe_alerts", bf.subscribe_alerts), group=1)
+ptb.add_handler(CommandHandler("unsubscribe_alerts", bf.unsubscribe_alerts), group=1)
 ptb.add_handler(CommandHandler("help", bf.send_help_message), group=1)
\ No newline at end of file
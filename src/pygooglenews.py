@@ -1,50 +1,116 @@
-import feedparser
-from bs4 import BeautifulSoup
 import urllib
-from dateparser import parse as parse_date
-import requests
-
+import httpx
+import time
+from collections import OrderedDict
+from src.utils.article import Article, with_sub_articles
+from src.utils.article_store import article_store
+from src.utils.percolator import new_articles
+from src.utils.feed_cache import feed_cache
+from src.utils.date_parsing import normalise_date
+from src.utils.rate_limiter import get_with_backoff
+from src.utils.egress_pool import egress_pool
+from src.utils.constants import EGRESS_MAX_ATTEMPTS
+try:
+    from src.utils import rss_parser
+except ImportError:  # lxml not installed, only the feedparser mode is available
+    rss_parser = None
+
+# One keep-alive client per egress path (direct or a given proxy), shared by every GoogleNews object in the process
+_http_clients = {}
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def get_http_client(proxy = None) -> httpx.AsyncClient:
+    """Return the shared AsyncClient for the given proxy URL, creating it on first use"""
+    client = _http_clients.get(proxy)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=_http2_available(),
+            proxy=proxy,
+            follow_redirects=True,
+            timeout=httpx.Timeout(15.0, connect=5.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30),
+        )
+        _http_clients[proxy] = client
+    return client
+
+async def close_http_clients():
+    """Close every shared client, to be called when the app shuts down"""
+    for client in _http_clients.values():
+        await client.aclose()
+    _http_clients.clear()
+
+# ETag / Last-Modified of the last full response per feed URL, together with the entries parsed from it
+_feed_validators = OrderedDict()
+MAX_TRACKED_FEEDS = 512
+
+def _conditional_headers(previous):
+    """Build If-None-Match / If-Modified-Since headers from the validators remembered for a feed"""
+    headers = {}
+    if previous:
+        if previous['etag']:
+            headers['If-None-Match'] = previous['etag']
+        if previous['last_modified']:
+            headers['If-Modified-Since'] = previous['last_modified']
+    return headers
+
+def _remember_validators(feed_url, response, parsed):
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if not etag and not last_modified:
+        _feed_validators.pop(feed_url, None)
+        return
+    _feed_validators[feed_url] = {'etag': etag, 'last_modified': last_modified, 'feed': parsed['feed'], 'entries': parsed['entries']}
+    _feed_validators.move_to_end(feed_url)
+    while len(_feed_validators) > MAX_TRACKED_FEEDS:
+        _feed_validators.popitem(last=False)
+
+class FeedStatusError(Exception):
+    """Google News answered with an HTTP error status"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+def _is_egress_failure(error) -> bool:
+    """
+    Whether a failed fetch counts against the egress member: transport errors, 429 and 5xx.
+    Other HTTP errors, like a 404 for a bad topic hash, would fail the same way through any member.
+    """
+    return not isinstance(error, FeedStatusError) or error.status_code == 429 or error.status_code >= 500
+
+def _proxy_url(proxies):
+    """Pick the proxy URL out of a requests-style proxies dict"""
+    if isinstance(proxies, str):
+        return proxies
+    return proxies.get('https') or proxies.get('http')
 
 
 class GoogleNews:
-    def __init__(self, lang = 'en', country = 'US'):
+    def __init__(self, lang = 'en', country = 'US', parser = 'fast'):
+        """
+        :param str parser: 'fast' streams the RSS with lxml, 'feedparser' uses feedparser;
+            both return the entries as Article records
+        """
         self.lang = lang.lower()
         self.country = country.upper()
         self.BASE_URL = 'https://news.google.com/rss'
-
-    def __top_news_parser(self, text):
-        """Return subarticles from the main and topic feeds"""
-        try:
-            bs4_html = BeautifulSoup(text, "html.parser")
-            # find all li tags
-            lis = bs4_html.find_all('li')
-            sub_articles = []
-            for li in lis:
-                try:
-                    sub_articles.append({"url": li.a['href'],
-                                         "title": li.a.text,
-                                         "publisher": li.font.text})
-                except:
-                    pass
-            return sub_articles
-        except:
-            return text
+        self.parser = parser if parser == 'feedparser' or rss_parser is not None else 'feedparser'
 
     def __ceid(self):
         """Compile correct country-lang parameters for Google News RSS URL"""
         return '?ceid={}:{}&hl={}&gl={}'.format(self.country,self.lang,self.lang,self.country)
 
-    def __add_sub_articles(self, entries):
-        for i, val in enumerate(entries):
-            if 'summary' in entries[i].keys():
-                entries[i]['sub_articles'] = self.__top_news_parser(entries[i]['summary'])
-            else:
-                entries[i]['sub_articles'] = None
-        return entries
-
-    def __scaping_bee_request(self, api_key, url):
-        response = requests.get(
-            url="https://app.scrapingbee.com/api/v1/",
+    async def __scaping_bee_request(self, api_key, url, egress = None):
+        response = await get_with_backoff(
+            get_http_client(),
+            "https://app.scrapingbee.com/api/v1/",
+            egress=egress,
             params={
                 "api_key": api_key,
                 "url": url,
@@ -53,79 +119,121 @@ class GoogleNews:
         )
         if response.status_code == 200:
             return response
-        if response.status_code != 200:
+        if response.status_code in (401, 403):
+            # Invalid or exhausted API key, a failure of this egress member
             raise Exception("ScrapingBee status_code: "  + str(response.status_code) + " " + response.text)
+        if response.status_code != 200:
+            raise FeedStatusError("ScrapingBee status_code: "  + str(response.status_code) + " " + response.text, response.status_code)
 
-    def __parse_feed(self, feed_url, proxies=None, scraping_bee = None):
+    async def __request(self, feed_url, proxy=None, scraping_bee=None, headers=None, egress=None):
+        if scraping_bee:
+            return await self.__scaping_bee_request(url = feed_url, api_key = scraping_bee, egress = egress)
+        r = await get_with_backoff(get_http_client(proxy), feed_url, egress=egress, headers=headers)
+        if r.status_code >= 400:
+            raise FeedStatusError("Google News status_code: " + str(r.status_code), r.status_code)
+        return r
+
+    async def __request_through_pool(self, feed_url, headers):
+        """Fetch through the healthiest egress member, moving on to another member if it fails"""
+        tried = []
+        while True:
+            member = egress_pool.choose(exclude=tried)
+            started = time.monotonic()
+            try:
+                r = await self.__request(feed_url, proxy=member.proxy, scraping_bee=member.scraping_bee_key,
+                                         headers=None if member.scraping_bee_key else headers, egress=None if member.name == 'direct' else member.name)
+            except Exception as e:
+                if not _is_egress_failure(e):
+                    # The member delivered the answer fine, retrying elsewhere would only repeat it
+                    egress_pool.report(member, time.monotonic() - started, ok=True)
+                    raise
+                egress_pool.report(member, time.monotonic() - started, ok=False)
+                tried.append(member)
+                if len(tried) >= min(EGRESS_MAX_ATTEMPTS, len(egress_pool)):
+                    raise
+                continue
+            egress_pool.report(member, time.monotonic() - started, ok=True)
+            return r
+
+    async def __parse_feed(self, feed_url, proxies=None, scraping_bee = None):
 
         if scraping_bee and proxies:
             raise Exception("Pick either ScrapingBee or proxies. Not both!")
 
-        if proxies:
-            r = requests.get(feed_url, proxies = proxies)
-        else:
-            r = requests.get(feed_url)
+        previous = _feed_validators.get(feed_url)
+        headers = _conditional_headers(previous)
 
-        if scraping_bee:
-            r = self.__scaping_bee_request(url = feed_url, api_key = scraping_bee)
+        if scraping_bee or proxies:
+            r = await self.__request(feed_url, proxy=_proxy_url(proxies) if proxies else None, scraping_bee=scraping_bee, headers=headers)
         else:
-            r = requests.get(feed_url)
+            r = await self.__request_through_pool(feed_url, headers)
 
+        if r.status_code == 304 and previous:
+            _feed_validators.move_to_end(feed_url)
+            return {'feed': previous['feed'], 'entries': list(previous['entries'])}
 
-        if 'https://news.google.com/rss/unsupported' in r.url:
+        if 'https://news.google.com/rss/unsupported' in str(r.url):
             raise Exception('This feed is not available')
 
-        d = feedparser.parse(r.text)
-
-        if not scraping_bee and not proxies and len(d['entries']) == 0:
-            d = feedparser.parse(feed_url)
+        if self.parser == 'fast':
+            parsed = rss_parser.parse_feed(r.content)
+        else:
+            import feedparser  # only needed in feedparser mode, imported on first use
+            d = feedparser.parse(r.text)
+            parsed = {'feed': d['feed'], 'entries': [Article.from_feedparser(entry) for entry in d['entries'] if entry.get('published_parsed')]}
+
+        parsed['entries'] = with_sub_articles(parsed['entries'])
+        _remember_validators(feed_url, r, parsed)
+        return {'feed': parsed['feed'], 'entries': list(parsed['entries'])}
+
+    async def __get_feed(self, feed_url, proxies=None, scraping_bee=None):
+        """Return the feed at feed_url as {'feed': ..., 'entries': [Article, ...]}, going through the shared feed cache"""
+        async def fetch():
+            d = await self.__parse_feed(feed_url, proxies=proxies, scraping_bee=scraping_bee)
+            article_store.record_fetch(feed_url, d['entries'])
+            new_articles.offer(d['entries'])
+            return d
 
-        return dict((k, d[k]) for k in ('feed', 'entries'))
+        d = await feed_cache.get_or_fetch((self.parser, feed_url), fetch)
+        return {'feed': d['feed'], 'entries': list(d['entries'])}
 
     def __search_helper(self, query):
         return urllib.parse.quote_plus(query)
 
     def __from_to_helper(self, validate=None):
         try:
-            validate = parse_date(validate).strftime('%Y-%m-%d')
-            return str(validate)
+            return normalise_date(validate)
         except:
             raise Exception('Could not parse your date')
 
 
 
-    def top_news(self, proxies=None, scraping_bee = None):
+    async def top_news(self, proxies=None, scraping_bee = None):
         """Return a list of all articles from the main page of Google News
         given a country and a language"""
-        d = self.__parse_feed(self.BASE_URL + self.__ceid(), proxies=proxies, scraping_bee=scraping_bee)
-        d['entries'] = self.__add_sub_articles(d['entries'])
-        return d
+        return await self.__get_feed(self.BASE_URL + self.__ceid(), proxies=proxies, scraping_bee=scraping_bee)
 
-    def topic_headlines(self, topic: str, proxies=None, scraping_bee=None):
+    async def topic_headlines(self, topic: str, proxies=None, scraping_bee=None):
         """Return a list of all articles from the topic page of Google News
         given a country and a language"""
         #topic = topic.upper()
         if topic.upper() in ['WORLD', 'NATION', 'BUSINESS', 'TECHNOLOGY', 'ENTERTAINMENT', 'SCIENCE', 'SPORTS', 'HEALTH']:
-            d = self.__parse_feed(self.BASE_URL + '/headlines/section/topic/{}'.format(topic.upper()) + self.__ceid(), proxies = proxies, scraping_bee=scraping_bee)
+            d = await self.__get_feed(self.BASE_URL + '/headlines/section/topic/{}'.format(topic.upper()) + self.__ceid(), proxies = proxies, scraping_bee=scraping_bee)
 
         else:
-            d = self.__parse_feed(self.BASE_URL + '/topics/{}'.format(topic) + self.__ceid(), proxies = proxies, scraping_bee=scraping_bee)
+            d = await self.__get_feed(self.BASE_URL + '/topics/{}'.format(topic) + self.__ceid(), proxies = proxies, scraping_bee=scraping_bee)
 
-        d['entries'] = self.__add_sub_articles(d['entries'])
         if len(d['entries']) > 0:
             return d
         else:
             raise Exception('unsupported topic')
 
-    def geo_headlines(self, geo: str, proxies=None, scraping_bee=None):
+    async def geo_headlines(self, geo: str, proxies=None, scraping_bee=None):
         """Return a list of all articles about a specific geolocation
         given a country and a language"""
-        d = self.__parse_feed(self.BASE_URL + '/headlines/section/geo/{}'.format(geo) + self.__ceid(), proxies = proxies, scraping_bee=scraping_bee)
+        return await self.__get_feed(self.BASE_URL + '/headlines/section/geo/{}'.format(geo) + self.__ceid(), proxies = proxies, scraping_bee=scraping_bee)
 
-        d['entries'] = self.__add_sub_articles(d['entries'])
-        return d
-
-    def search(self, query: str, helper = True, when = None, from_ = None, to_ = None, proxies=None, scraping_bee=None):
+    async def search(self, query: str, helper = True, when = None, from_ = None, to_ = None, proxies=None, scraping_bee=None):
         """
         Return a list of all articles given a full-text search parameter,
         a country and a language
@@ -151,7 +259,4 @@ class GoogleNews:
         search_ceid = self.__ceid()
         search_ceid = search_ceid.replace('?', '&')
 
-        d = self.__parse_feed(self.BASE_URL + '/search?q={}'.format(query) + search_ceid, proxies = proxies, scraping_bee=scraping_bee)
-
-        d['entries'] = self.__add_sub_articles(d['entries'])
-        return d
\ No newline at end of file
+        return await self.__get_feed(self.BASE_URL + '/search?q={}'.format(query) + search_ceid, proxies = proxies, scraping_bee=scraping_bee)
\ No newline at end of file
@@ -0,0 +1,115 @@
+import time
+from datetime import date
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def title_dedupe_key(title: str) -> str:
+    """Google News titles end with ' - Publisher', the same story from different publishers shares the part before it"""
+    return title.rpartition('-')[0].strip()
+
+
+@lru_cache(maxsize=None)
+def _days_before_year(year):
+    return date(year, 1, 1).toordinal() - _EPOCH_ORDINAL
+
+
+def epoch_seconds(published_parsed) -> int:
+    """UTC struct_time to epoch seconds, same as calendar.timegm but using tm_yday and a per-year cache"""
+    return (_days_before_year(published_parsed[0]) + published_parsed[7] - 1) * 86400 + published_parsed[3] * 3600 + published_parsed[4] * 60 + published_parsed[5]
+
+
+@lru_cache(maxsize=4096)
+def _date_string(day):
+    return date.fromordinal(_EPOCH_ORDINAL + day).strftime('%d %b %Y')
+
+
+class SubArticle(NamedTuple):
+    """One entry of the related coverage listed in a Google News summary"""
+    url: str
+    title: str
+    publisher: str
+
+
+def _sub_articles(summary) -> tuple:
+    # Only feeds listing related coverage (top news, topics) carry a list in the summary
+    if not summary or '<li' not in summary:
+        return ()
+    parsed = parse_sub_articles(summary)
+    if not isinstance(parsed, list):
+        return ()
+    return tuple(SubArticle(sub_article['url'], sub_article['title'], sub_article['publisher']) for sub_article in parsed)
+
+
+class Article(NamedTuple):
+    """
+    One feed item, as passed from the parser through the cache, post-processing and rendering.
+    A plain tuple: no per-instance dict, immutable, so cached lists can be shared between requests.
+    """
+    title: str
+    link: str
+    publisher: Optional[str]
+    published: int  # epoch seconds, UTC
+    dedupe_key: str
+    summary: Optional[str] = None  # raw description HTML
+    publisher_url: Optional[str] = None  # publisher home page from <source url="...">, what site: searches match
+    related: Optional[tuple] = None  # sub_articles attached by with_sub_articles, None when not parsed yet
+
+    @classmethod
+    def create(cls, title, link, publisher, published, summary = None, publisher_url = None):
+        return cls(title, link, publisher, published, title_dedupe_key(title), summary, publisher_url)
+
+    @classmethod
+    def from_feedparser(cls, entry):
+        source = entry.get('source') or {}
+        return cls.create(entry.get('title', ''), entry.get('link', ''), source.get('title'), epoch_seconds(entry['published_parsed']),
+                          entry.get('summary'), source.get('href'))
+
+    @property
+    def date(self) -> str:
+        """Publication day as shown in the PDFs, e.g. '14 Oct 2024'"""
+        return _date_string(self.published // 86400)
+
+    @property
+    def published_parsed(self) -> time.struct_time:
+        return time.gmtime(self.published)
+
+    @property
+    def sub_articles(self) -> tuple:
+        """Related coverage (SubArticles) listed in the summary, parsed on access unless attached when the feed was fetched"""
+        return self.related if self.related is not None else _sub_articles(self.summary)
+
+
+def with_sub_articles(articles: list[Article]) -> list[Article]:
+    """
+    The articles with their sub_articles parsed and attached, done once per fetched feed before it is cached,
+    as every cache hit reads them again. Articles built elsewhere (e.g. from the database) stay lazy.
+    """
+    return [article if article.related is not None else article._replace(related=_sub_articles(article.summary)) for article in articles]
+
+
+def _parse_sub_articles_bs4(summary):
+    from bs4 import BeautifulSoup  # only needed without lxml, imported on first use
+    try:
+        bs4_html = BeautifulSoup(summary, "html.parser")
+        sub_articles = []
+        for li in bs4_html.find_all('li'):
+            try:
+                sub_articles.append({"url": li.a['href'],
+                                     "title": li.a.text,
+                                     "publisher": li.font.text})
+            except:
+                pass
+        return sub_articles
+    except:
+        return summary
+
+
+def parse_sub_articles(summary):
+    try:
+        from src.utils.rss_parser import parse_sub_articles as parse_with_lxml
+    except ImportError:
+        return _parse_sub_articles_bs4(summary)
+    return parse_with_lxml(summary)
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import re
+import time
+from datetime import date, datetime, timedelta, timezone
+from hashlib import blake2b
+from urllib.parse import urlsplit, parse_qs
+from src.database.database import get_db
+import src.database.crud as crud
+from src.utils.article import Article
+from src.utils.coalesce import canonical_query, canonical_topic_hash
+from src.utils.search_query import compile_search, site_pattern
+from src.utils.date_parsing import when_delta
+from src.utils.constants import GOOGLE_SEARCH_RESULT_LIMIT, LOCAL_SEARCH_MAX_AGE_SECONDS
+
+# Every feed fetched from Google News is written to the articles table in the background, linked to a feed key
+# that ignores the search time filters (query:US:en:<canonical query>, topic:US:en:<hash>, ...).
+# Searches with a when: or after:/before: filter are also recorded in feedCoverage with the window they covered,
+# so the same (or a narrower) past range can later be answered from the database instead of Google. In local-first
+# mode, a search is answered from the full-text index over every stored article when a recent fetch covered its window.
+
+_TIME_FILTER = re.compile(r'(?:^|\s)(when|after|before):(\S+)')
+
+
+def url_hash(link: str) -> str:
+    return blake2b(link.encode(), digest_size=16).hexdigest()
+
+
+def query_feed_key(query: str, country: str = 'US', lang: str = 'en') -> str:
+    return f"query:{country}:{lang}:{canonical_query(query)}"
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time(), timezone.utc)
+
+
+def feed_key_for_url(feed_url: str, now: datetime = None):
+    """
+    Return (feed key, searched (start, end) datetimes or None) for a Google News RSS URL built by GoogleNews.
+    A when: window ends at `now`, the time of the fetch.
+    """
+    parts = urlsplit(feed_url)
+    params = parse_qs(parts.query)
+    ceid = params.get('ceid', [''])[0]
+    path = parts.path.removeprefix('/rss')
+    if path == '/search':
+        search = params.get('q', [''])[0]
+        filters = dict(_TIME_FILTER.findall(search))
+        key = f"query:{ceid}:{canonical_query(_TIME_FILTER.sub(' ', search))}"
+        try:
+            if 'when' in filters:
+                now = now or datetime.now(timezone.utc)
+                return key, (now - when_delta(filters['when']), now)
+            if 'after' in filters and 'before' in filters:
+                return key, (_midnight(date.fromisoformat(filters['after'])), _midnight(date.fromisoformat(filters['before'])))
+        except ValueError:
+            pass
+        return key, None
+    if path.startswith('/topics/'):
+        return f"topic:{ceid}:{canonical_topic_hash(path.removeprefix('/topics/'))}", None
+    if path.startswith('/headlines/section/topic/'):
+        return f"topic:{ceid}:{path.removeprefix('/headlines/section/topic/').upper()}", None
+    if path.startswith('/headlines/section/geo/'):
+        return f"geo:{ceid}:{path.removeprefix('/headlines/section/geo/')}", None
+    return f"top:{ceid}", None
+
+
+def _row(article: Article) -> dict:
+    return {"url_hash": url_hash(article.link), "link": article.link, "title": article.title, "publisher": article.publisher,
+            "publisher_url": article.publisher_url, "published_at": datetime.fromtimestamp(article.published, timezone.utc), "summary": article.summary}
+
+
+def _article(stored) -> Article:
+    return Article.create(stored.title, stored.link, stored.publisher, int(stored.published_at.timestamp()), stored.summary, stored.publisher_url)
+
+
+class ArticleStore:
+    """Background writer for fetched feeds and reader for the date ranges already covered"""
+
+    def __init__(self, enabled = False):
+        self.enabled = enabled
+        self._pending = set()
+        self._stats = {"feeds_written": 0, "articles_written": 0, "write_errors": 0, "range_hits": 0, "range_misses": 0,
+                       "range_hit_ms": 0.0, "upstream_ms": 0.0, "local_hits": 0, "local_unsupported": 0, "local_uncovered": 0, "local_hit_ms": 0.0}
+
+    def record_fetch(self, feed_url: str, articles: list[Article]):
+        """Schedule the upsert of a freshly fetched feed, never blocking or failing the fetch itself"""
+        if not self.enabled or not articles:
+            return
+        task = asyncio.ensure_future(self._write(feed_url, articles, datetime.now(timezone.utc)))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _write(self, feed_url: str, articles: list[Article], fetched_at: datetime):
+        feed_key, window = feed_key_for_url(feed_url, fetched_at)
+        try:
+            async with get_db() as db:
+                written = await crud.upsert_articles(db, feed_key, [_row(article) for article in articles])
+                if window:
+                    # Nothing after the fetch is covered. Only the whole days inside the window, which had fully
+                    # elapsed when fetched, are final and can serve past ranges (range_from > range_to when there are none)
+                    start, end = window[0], min(window[1], fetched_at)
+                    range_from = start.date() if start == _midnight(start.date()) else start.date() + timedelta(days=1)
+                    await crud.add_feed_coverage(db, feed_key, range_from, end.date(), start, end, len(articles))
+            self._stats["feeds_written"] += 1
+            self._stats["articles_written"] += written
+        except Exception as e:
+            self._stats["write_errors"] += 1
+            logging.warning(f"Could not store articles of {feed_key}: {e}")
+
+    async def covered_range(self, query: str, from_: date, to_: date):
+        """
+        Articles of a past from_/to_ search answered from the database, or None when Google has to be asked.
+        A stored window serves itself and, if it was not cut off at Google's result limit, any window inside it.
+        """
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        feed_key = query_feed_key(query)
+        try:
+            async with get_db() as db:
+                coverage = await crud.get_feed_coverage(db, feed_key, from_, to_)
+                if not any(row.article_count < GOOGLE_SEARCH_RESULT_LIMIT or (row.range_from, row.range_to) == (from_, to_) for row in coverage):
+                    self._stats["range_misses"] += 1
+                    return None
+                # Same window as after:from_ before:to_, the before: day itself excluded
+                start, end = _midnight(from_), _midnight(to_)
+                stored = await crud.get_articles_by_feed(db, feed_key, start, end)
+        except Exception as e:
+            logging.warning(f"Could not read stored articles for {feed_key}: {e}")
+            return None
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._stats["range_hits"] += 1
+        self._stats["range_hit_ms"] += elapsed_ms
+        logging.info(f"{feed_key} {from_}..{to_} answered from the article store: {len(stored)} articles in {elapsed_ms:.1f} ms")
+        return [_article(row) for row in stored]
+
+    async def search_local(self, query: str, start: datetime, end: datetime):
+        """
+        Articles published in [start, end) matching the search, answered from the full-text index, or None when
+        Google has to be asked: the search uses operators the index cannot evaluate, or no fetch of it covered
+        [start, end) up to the last LOCAL_SEARCH_MAX_AGE_SECONDS (the index may then be missing part of the window).
+        A fetch cut off at Google's result limit only covers practically the same window.
+        """
+        if not self.enabled:
+            return None
+        search = compile_search(query)
+        if search is None:
+            self._stats["local_unsupported"] += 1
+            return None
+        started = time.perf_counter()
+        feed_key = query_feed_key(query)
+        try:
+            async with get_db() as db:
+                max_age = timedelta(seconds=LOCAL_SEARCH_MAX_AGE_SECONDS)
+                coverage = await crud.get_feed_window_coverage(db, feed_key, start, min(end, datetime.now(timezone.utc)) - max_age)
+                if not any(row.article_count < GOOGLE_SEARCH_RESULT_LIMIT or start - row.covered_from <= max_age for row in coverage):
+                    self._stats["local_uncovered"] += 1
+                    return None
+                stored = await crud.search_articles(db, search.text, [site_pattern(site) for site in search.sites], [site_pattern(site) for site in search.excluded_sites],
+                                                    list(search.titles), list(search.excluded_titles), start, end, GOOGLE_SEARCH_RESULT_LIMIT)
+        except Exception as e:
+            logging.warning(f"Local search for {feed_key} failed: {e}")
+            return None
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._stats["local_hits"] += 1
+        self._stats["local_hit_ms"] += elapsed_ms
+        logging.info(f"{feed_key} answered from the local index: {len(stored)} articles in {elapsed_ms:.1f} ms")
+        return [_article(row) for row in stored]
+
+    def record_upstream(self, elapsed_ms: float):
+        """Time spent on a from_/to_ search that had to go to Google, to compare with range_hit_ms"""
+        self._stats["upstream_ms"] += elapsed_ms
+
+    async def flush(self):
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def stats(self):
+        hits, misses = self._stats["range_hits"], self._stats["range_misses"]
+        return {**self._stats, "pending_writes": len(self._pending),
+                "avg_range_hit_ms": round(self._stats["range_hit_ms"] / hits, 1) if hits else None,
+                "avg_upstream_ms": round(self._stats["upstream_ms"] / misses, 1) if misses else None,
+                "avg_local_hit_ms": round(self._stats["local_hit_ms"] / self._stats["local_hits"], 1) if self._stats["local_hits"] else None}
+
+
+article_store = ArticleStore()
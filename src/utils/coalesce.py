@@ -0,0 +1,88 @@
+import asyncio
+import re
+import time
+from src.utils.constants import PUBLIC_TOPICS, COALESCE_WINDOW_SECONDS
+
+# A search token: an optionally negated operator with a quoted value, a quoted phrase, or a bare word
+_QUERY_TOKEN = re.compile(r'-?\w+:"[^"]*"|-?"[^"]*"|\S+')
+# Tokens whose meaning depends on their neighbours, queries containing them keep their original order
+_ORDER_SENSITIVE = re.compile(r'^(OR|AND|\||AROUND\(\d+\))$')
+_KEEP_UPPERCASE = re.compile(r'^(OR|AND|AROUND\(\d+\))$')
+
+
+def canonical_query(query: str) -> str:
+    """
+    Normalise a Google News search so equivalent queries share one fetch:
+    collapse whitespace, lowercase everything but the OR/AND/AROUND operators, and sort the terms
+    when the query is a plain conjunction (no OR / AROUND), since term order does not change the matches then.
+    """
+    tokens = []
+    for token in _QUERY_TOKEN.findall(query):
+        if _KEEP_UPPERCASE.match(token):
+            tokens.append(token)
+        elif '"' in token:
+            # Inside quotes only whitespace and case are normalised, word order matters
+            tokens.append(re.sub(r'\s+', ' ', token.lower()).replace('" ', '"').replace(' "', '"'))
+        else:
+            tokens.append(token.lower())
+    if not any(_ORDER_SENSITIVE.match(token) for token in tokens):
+        tokens.sort()
+    return " ".join(tokens)
+
+
+def canonical_topic_hash(topic_hash: str) -> str:
+    """Public topics are case-insensitive, custom topic hashes are not"""
+    return topic_hash.upper() if topic_hash.upper() in PUBLIC_TOPICS.values() else topic_hash
+
+
+class Coalescer:
+    """
+    Shares one call of an expensive coroutine between all callers asking for the same key:
+    callers arriving while it runs await the same task, callers arriving up to `window` seconds
+    after it finished get its result.
+    """
+
+    def __init__(self, window = COALESCE_WINDOW_SECONDS):
+        self.window = window
+        self._inflight = {}
+        self._recent = {}
+        self._stats = {"requests": 0, "merged_inflight": 0, "merged_recent": 0}
+
+    async def run(self, key, fn):
+        self._stats["requests"] += 1
+        now = time.monotonic()
+        recent = self._recent.get(key)
+        if recent is not None:
+            finished_at, result = recent
+            if now - finished_at < self.window:
+                self._stats["merged_recent"] += 1
+                return result
+            del self._recent[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._stats["merged_inflight"] += 1
+        else:
+            task = asyncio.ensure_future(self._run(key, fn))
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _run(self, key, fn):
+        try:
+            result = await fn()
+            self._prune(time.monotonic())
+            self._recent[key] = (time.monotonic(), result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def _prune(self, now):
+        for key in [key for key, (finished_at, _) in self._recent.items() if now - finished_at >= self.window]:
+            del self._recent[key]
+
+    def stats(self):
+        merged = self._stats["merged_inflight"] + self._stats["merged_recent"]
+        return {**self._stats, "merged": merged, "upstream_calls": self._stats["requests"] - merged}
+
+
+coalescer = Coalescer()
@@ -21,6 +21,97 @@ PUBLIC_TOPICS = {
     'health': 'HEALTH'
 }
 
+# Feed cache: seconds a feed is fresh, seconds it may be served stale while refreshing, and its size bounds
+FEED_CACHE_TTL_SECONDS = 5 * 60
+FEED_CACHE_STALE_SECONDS = 60 * 60
+FEED_CACHE_MAX_FEEDS = 512
+FEED_CACHE_MAX_ARTICLES = 50_000
+
+# Number of feeds fetched concurrently for "all saved topics / queries"
+FETCH_MANY_CONCURRENCY = 4
+
+# Per-host request budgets as (requests per second, burst), overridable with RATE_LIMITS=host=rate:burst,...
+RATE_LIMITS = {
+    'news.google.com': (2.0, 5),
+    'app.scrapingbee.com': (5.0, 10),
+}
+DEFAULT_RATE_LIMIT = (5.0, 10)
+RETRY_STATUS_CODES = (429, 503)
+MAX_FETCH_RETRIES = 3
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30
+MAX_RETRY_AFTER_SECONDS = 120
+
+# Egress pool health: EWMA weight, failures in a row before ejection, ejection cool-down (doubles per repeat) and members tried per fetch
+EGRESS_EWMA_ALPHA = 0.2
+EGRESS_EJECT_AFTER_FAILURES = 3
+EGRESS_EJECT_SECONDS = 30
+EGRESS_MAX_EJECT_SECONDS = 15 * 60
+EGRESS_MAX_ATTEMPTS = 2
+
+# Prefetch scheduler: seconds between cycles, max feeds refreshed per cycle (the request budget) and saved topics considered
+PREFETCH_INTERVAL_SECONDS = 4 * 60
+PREFETCH_MAX_FEEDS = 60
+PREFETCH_SAVED_TOPICS = 30
+# Most popular feeds fetched at once on startup, before /readyz reports the feed cache as primed
+PREFETCH_PRIME_FEEDS = 8
+
+# Scheduled digests: how often due subscriptions are checked, and how late a missed delivery is still sent
+DIGEST_CHECK_INTERVAL_SECONDS = 60
+DIGEST_CATCH_UP_MINUTES = 60
+# Combined (-d) digests: minimum seconds between two edits of the progress message
+DIGEST_PROGRESS_EDIT_SECONDS = 2
+
+# Identical requests finishing less than this many seconds apart share one result
+COALESCE_WINDOW_SECONDS = 10
+
+# Near-duplicate stories: headlines whose word / word-pair sets overlap at least this much (Jaccard) are rendered
+# once (None disables the clustering), the number of LSH bands the 16 MinHash values are split into (more bands
+# find lower similarities at the cost of more comparisons), and the words ignored when comparing headlines
+NEAR_DUPLICATE_MIN_SIMILARITY = 0.5
+NEAR_DUPLICATE_BANDS = 8
+NEAR_DUPLICATE_STOPWORDS = frozenset((
+    'a', 'an', 'the', 'and', 'or', 'of', 'to', 'in', 'on', 'at', 'for', 'by', 'with', 'from', 'as', 'is', 'are', 'was', 'were',
+    'be', 'it', 'its', 'this', 'that', 'after', 'over', 'says', 'said', 'new', 'news', 'live', 'update', 'updates',
+))
+
+# Delivered-articles store behind the "new since last time" flag: bits and hash functions per Bloom filter generation
+# (8 KB, about 1% false positives up to 3k articles a day, two keys each), how long a generation lasts, generations kept (so articles
+# are remembered for 2 to 3 days) and users whose filters stay in memory
+SEEN_FILTER_BITS = 1 << 16
+SEEN_FILTER_HASHES = 7
+SEEN_GENERATION_SECONDS = 24 * 60 * 60
+SEEN_GENERATIONS = 3
+SEEN_CACHE_USERS = 256
+# Filters changed by deliveries are written back to the database at most this often (and on eviction and shutdown)
+SEEN_FLUSH_SECONDS = 60
+
+# Google News search feeds return at most this many items, a search window that hit it may be missing articles
+GOOGLE_SEARCH_RESULT_LIMIT = 100
+# Local-first /query_news answers from the full-text index only if the same search was fetched from Google this recently
+LOCAL_SEARCH_MAX_AGE_SECONDS = 30 * 60
+
+# PDF rendering off the event loop: 'process' (one worker per core unless RENDER_WORKERS is set), 'thread' or 'inline',
+# renders waiting for a worker before new ones are turned away, and seconds after which the user is told it took too long
+RENDER_EXECUTOR = 'process'
+RENDER_MAX_QUEUE = 32
+RENDER_TIMEOUT_SECONDS = 60
+
+# Rendered PDFs kept in memory, and on disk when PDF_CACHE_SPILL_DIR is set (PDF_CACHE_MAX_MB / PDF_CACHE_SPILL_MAX_MB override)
+PDF_CACHE_MAX_BYTES = 64 * 2 ** 20
+PDF_CACHE_SPILL_MAX_BYTES = 512 * 2 ** 20
+# Telegram file_ids of uploaded documents remembered for sending the same document again without uploading it
+FILE_ID_STORE_SIZE = 4096
+
+# Breaking-news alerts for saved queries: how often newly fetched articles are percolated and sent, how often the
+# saved queries are reloaded, how old an article may be to still count as breaking, how many new articles may wait
+# between runs and how many are sent to a user in one alert
+ALERT_INTERVAL_SECONDS = 60
+ALERT_RELOAD_SECONDS = 5 * 60
+ALERT_MAX_ARTICLE_AGE_SECONDS = 2 * 60 * 60
+ALERT_MAX_PENDING_ARTICLES = 20_000
+ALERT_MAX_ARTICLES_PER_MESSAGE = 10
+
 help_message = """
 *Welcome to the News Bot\!*
 
@@ -45,7 +136,7 @@ Stay updated with the latest news tailored to your interests\. Here's a brief gu
     1\. Send `/top\_news`
     2\. Choose a country from the provided list
 
-• */topic\_news* \[\-c\] \[\-f \<days\>\]
+• */topic\_news* \[\-c\] \[\-f \<days\>\] \[\-n\] \[\-d\]
   \- Fetch news articles based on your saved topics or a custom topic
   \- Pre\-defined topics: `business`, `entertainment`, `nation`, `world`, `science`, `sports`, `technology`, `health`
   \- *Flags:*
@@ -56,13 +147,23 @@ Stay updated with the latest news tailored to your interests\. Here's a brief gu
       \- Filter news articles from the past specified number of days  
       \- Example: `/topic\_news \-f 3` fetches news from the past 3 days  
       \- If not specified, defaults to 1 day
+    \- *\-n*  
+      \- Only send articles you have not received in the past 2 days
+    \- *\-d*  
+      \- Send all saved topics as one PDF with a section per topic
 
-• */query\_news* \[\-c\]
+• */query\_news* \[\-c\] \[\-n\] \[\-l\] \[\-d\]
   \- Fetch news articles based on your saved queries or a custom query
   \- *Flags:*
     \- *\-c*  
       \- Choose specific queries to fetch news for  
       \- If not specified, news for all saved queries will be fetched
+    \- *\-n*  
+      \- Only send articles you have not received in the past 2 days
+    \- *\-l*  
+      \- Answer from articles the bot already collected when the query was searched in the last 30 minutes \(faster\)
+    \- *\-d*  
+      \- Send all saved queries as one PDF with a section per query
   \- *Time Filters:*
     \- *When Parameter*  
       \- Specify a time frame like `12h` \(hours\), `5d` \(days\), or `2m` \(months\)
@@ -71,6 +172,20 @@ Stay updated with the latest news tailored to your interests\. Here's a brief gu
     \- *Default*  
       \- If no time filter is specified, defaults to news from the past 1 day
 
+• */subscribe\_digest* \<HH:MM\> \[timezone\]
+  \- Receive news for all your saved topics and queries every day at the given time
+  \- Example: `/subscribe\_digest 07:30 Asia/Singapore` \(timezone defaults to UTC\)
+
+• */unsubscribe\_digest*
+  \- Stop the daily digest
+
+• */subscribe\_alerts*
+  \- Get a message as soon as a newly published article matches one of your saved queries
+  \- Articles are checked against your queries as the bot collects them, `AROUND`, wildcards and `inurl:` style operators are not supported
+
+• */unsubscribe\_alerts*
+  \- Stop breaking news alerts
+
 \_\_\_
 
 *User Preferences*
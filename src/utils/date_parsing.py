@@ -0,0 +1,58 @@
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+# Unambiguous formats handled without dateparser, tried after ISO 8601 (YYYY-MM-DD)
+FAST_DATE_FORMATS = (
+    '%Y/%m/%d',
+    '%Y.%m.%d',
+    '%Y%m%d',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d %H:%M:%S',
+    '%d %b %Y',
+    '%d %B %Y',
+    '%b %d %Y',
+    '%B %d %Y',
+    '%b %d, %Y',
+    '%B %d, %Y',
+)
+
+# Units of Google's when: filter (12h, 5d, 2m)
+_WHEN_UNITS = {'h': timedelta(hours=1), 'd': timedelta(days=1), 'm': timedelta(days=30)}
+
+def when_delta(when: str) -> timedelta:
+    """How far back a when: filter like 12h, 5d or 2m reaches. Raises ValueError if it is malformed."""
+    if len(when) < 2 or when[-1] not in _WHEN_UNITS or not when[:-1].isdigit():
+        raise ValueError(f"Invalid when filter: {when}")
+    return int(when[:-1]) * _WHEN_UNITS[when[-1]]
+
+@lru_cache(maxsize=1024)
+def _parse_strict(value: str):
+    """YYYY-MM-DD for ISO and the formats above, None otherwise. Safe to cache: the result never depends on today."""
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        pass
+    for date_format in FAST_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+def normalise_date(value: str) -> str:
+    """
+    Return value as a YYYY-MM-DD string.
+    ISO and the formats above are parsed strictly; dateparser is only imported for free-form input like "3 days ago".
+    Free-form results are not cached, relative dates change meaning every day.
+    Raises ValueError if the date cannot be parsed.
+    """
+    value = value.strip()
+    strict = _parse_strict(value)
+    if strict is not None:
+        return strict
+
+    from dateparser import parse as parse_date  # slow to import, deferred until free-form input shows up
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f"Could not parse date: {value}")
+    return parsed.strftime('%Y-%m-%d')
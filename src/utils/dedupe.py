@@ -0,0 +1,167 @@
+import re
+import struct
+from functools import lru_cache
+from hashlib import blake2b
+from src.utils.article import Article
+from src.utils.constants import NEAR_DUPLICATE_MIN_SIMILARITY, NEAR_DUPLICATE_BANDS, NEAR_DUPLICATE_STOPWORDS
+
+# Near-duplicate stories: MinHash signatures of the normalised headline shingles, indexed with LSH bands so that
+# only articles sharing a band are compared, plus the related coverage Google lists under an item
+
+SIGNATURE_SIZE = 16  # one 64-byte blake2b digest gives 16 independent 32-bit hashes per shingle
+_WORD = re.compile(r'\w+')
+
+
+@lru_cache(maxsize=1 << 16)
+def _shingle_hashes(shingle: str) -> tuple:
+    return struct.unpack(f'{SIGNATURE_SIZE}I', blake2b(shingle.encode(), digest_size=4 * SIGNATURE_SIZE).digest())
+
+
+def normalise_title(title: str) -> list[str]:
+    """Lowercased words of a headline, stopwords removed"""
+    return [word for word in _WORD.findall(title.lower()) if word not in NEAR_DUPLICATE_STOPWORDS]
+
+
+def shingles(words: list[str]) -> frozenset:
+    """Single words and word bigrams, so both vocabulary and word order count"""
+    return frozenset(words + [f"{first} {second}" for first, second in zip(words, words[1:])])
+
+
+def minhash(features: frozenset) -> tuple:
+    """MinHash signature: for each of the SIGNATURE_SIZE hash functions, the smallest hash over the shingles"""
+    return tuple(map(min, zip(*map(_shingle_hashes, features))))
+
+
+def jaccard(first: frozenset, second: frozenset) -> float:
+    return len(first & second) / len(first | second)
+
+
+def headline_shingles(article: Article) -> frozenset:
+    return _headline_features(article.dedupe_key or article.title)[0]
+
+
+@lru_cache(maxsize=1 << 14)
+def _headline_features(headline: str) -> tuple:
+    # Cached per headline: the same articles come back on every feed cache hit
+    features = shingles(normalise_title(headline))
+    return features, minhash(features) if features else None
+
+
+def _band_keys(signature: tuple):
+    rows = SIGNATURE_SIZE // NEAR_DUPLICATE_BANDS
+    return [(band, signature[band * rows:(band + 1) * rows]) for band in range(NEAR_DUPLICATE_BANDS)]
+
+
+class _DisjointSet:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i, j):
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i != root_j:
+            self.parent[max(root_i, root_j)] = min(root_i, root_j)
+
+
+def cluster_articles(articles: list[Article], min_similarity = NEAR_DUPLICATE_MIN_SIMILARITY, use_sub_articles = True) -> list[list[int]]:
+    """
+    Group articles reporting the same story and return the clusters as lists of indexes into `articles`.
+    Two articles are joined when the Jaccard similarity of their headline shingles is at least `min_similarity`,
+    or when one lists the other (same link or same headline) among its related coverage.
+    Signatures are split into NEAR_DUPLICATE_BANDS bands and only articles agreeing on a whole band are compared,
+    so the cost grows with the number of articles, not the number of pairs.
+    """
+    clusters = _DisjointSet(len(articles))
+
+    if min_similarity is not None:
+        # Articles with the same shingles are joined directly, only distinct shingle sets go through the index
+        first_with_shingles = {}
+        for i, article in enumerate(articles):
+            features, signature = _headline_features(article.dedupe_key or article.title)
+            if features in first_with_shingles:
+                clusters.union(i, first_with_shingles[features][0])
+            elif features:
+                first_with_shingles[features] = (i, signature)
+        buckets = {}
+        for features, (i, signature) in first_with_shingles.items():
+            compared = set()
+            for band_key in _band_keys(signature):
+                bucket = buckets.setdefault(band_key, [])
+                for other_features, j in bucket:
+                    if j not in compared:
+                        compared.add(j)
+                        if jaccard(features, other_features) >= min_similarity:
+                            clusters.union(i, j)
+                bucket.append((features, i))
+
+    if use_sub_articles:
+        by_link = {article.link: i for i, article in enumerate(articles)}
+        by_headline = {}
+        for i, article in enumerate(articles):
+            by_headline.setdefault(article.dedupe_key or article.title, i)
+        for i, article in enumerate(articles):
+            for sub_article in article.sub_articles:
+                j = by_link.get(sub_article.url)
+                if j is None:
+                    j = by_headline.get(sub_article.title.strip())
+                if j is not None:
+                    clusters.union(i, j)
+
+    grouped = {}
+    for i in range(len(articles)):
+        grouped.setdefault(clusters.find(i), []).append(i)
+    return list(grouped.values())
+
+
+def collapse_near_duplicates(articles: list[Article], min_similarity = NEAR_DUPLICATE_MIN_SIMILARITY, use_sub_articles = True) -> list[Article]:
+    """Keep the most recent article of every cluster, in the order the clusters first appear"""
+    representatives = []
+    for cluster in cluster_articles(articles, min_similarity, use_sub_articles):
+        representatives.append(max((articles[i] for i in cluster), key=lambda article: article.published))
+    return representatives
+
+
+class BatchDedupe:
+    """
+    Shared by the sections (feeds) sent together in one batch, so a story matching several of a user's topics
+    or queries is only rendered in the first section that claims it.
+    Stories are matched by link, by dedupe_key and by headline similarity, like cluster_articles.
+    """
+
+    def __init__(self, min_similarity = NEAR_DUPLICATE_MIN_SIMILARITY):
+        self.min_similarity = min_similarity
+        self._links = set()
+        self._keys = set()
+        self._buckets = {}
+        self.dropped = 0
+
+    def claim(self, articles: list[Article]) -> list[Article]:
+        """Return the articles no earlier section has claimed, and claim them for this one"""
+        fresh = []
+        for article in articles:
+            features, signature = _headline_features(article.dedupe_key or article.title)
+            if not self._seen(article, features, signature):
+                fresh.append((article, features, signature))
+        # Claimed only once the whole section is checked, so articles of one section never drop each other
+        for article, features, signature in fresh:
+            self._links.add(article.link)
+            self._keys.add(article.dedupe_key)
+            if self.min_similarity is not None and features:
+                for band_key in _band_keys(signature):
+                    self._buckets.setdefault(band_key, []).append(features)
+        self.dropped += len(articles) - len(fresh)
+        return [article for article, _, _ in fresh]
+
+    def _seen(self, article: Article, features: frozenset, signature: tuple) -> bool:
+        if article.link in self._links or (article.dedupe_key and article.dedupe_key in self._keys):
+            return True
+        if self.min_similarity is None or not features:
+            return False
+        return any(jaccard(features, other) >= self.min_similarity
+                   for band_key in _band_keys(signature) for other in self._buckets.get(band_key, ()))
@@ -0,0 +1,109 @@
+import logging
+import os
+import random
+import time
+from urllib.parse import urlsplit
+from src.utils.constants import EGRESS_EWMA_ALPHA, EGRESS_EJECT_AFTER_FAILURES, EGRESS_EJECT_SECONDS, EGRESS_MAX_EJECT_SECONDS
+
+
+class EgressMember:
+    """One way out to Google News: a direct connection, an HTTP proxy or a ScrapingBee API key"""
+
+    def __init__(self, name: str, proxy: str = None, scraping_bee_key: str = None):
+        self.name = name
+        self.proxy = proxy
+        self.scraping_bee_key = scraping_bee_key
+        self.latency = None  # EWMA of request latency in seconds
+        self.error_rate = 0.0  # EWMA of failures
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def is_available(self, now) -> bool:
+        return now >= self.ejected_until
+
+    def score(self) -> float:
+        """Lower is healthier; members without measurements yet score as fast so they get tried"""
+        latency = self.latency if self.latency is not None else 0.0
+        return (latency + 0.1) * (1 + 10 * self.error_rate)
+
+    def stats(self):
+        return {
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejected": not self.is_available(time.monotonic()),
+        }
+
+
+class EgressPool:
+    """
+    Routes each fetch to a healthy egress member.
+    Picks the better of two random available members (power of two choices), so load spreads while
+    slow or failing members get less traffic. A member failing EGRESS_EJECT_AFTER_FAILURES times in a row
+    is ejected for a cool-down that doubles on every repeated ejection.
+    """
+
+    def __init__(self, members: list[EgressMember]):
+        if not members:
+            members = [EgressMember("direct")]
+        self.members = members
+
+    def __len__(self):
+        return len(self.members)
+
+    def choose(self, exclude = ()) -> EgressMember:
+        now = time.monotonic()
+        candidates = [m for m in self.members if m not in exclude and m.is_available(now)]
+        if not candidates:
+            # Everything is ejected, fall back to whichever member comes back first
+            candidates = sorted((m for m in self.members if m not in exclude), key=lambda m: m.ejected_until)[:1] or self.members[:1]
+        if len(candidates) == 1:
+            return candidates[0]
+        first, second = random.sample(candidates, 2)
+        return first if first.score() <= second.score() else second
+
+    def report(self, member: EgressMember, latency: float, ok: bool):
+        member.requests += 1
+        member.error_rate = (1 - EGRESS_EWMA_ALPHA) * member.error_rate + EGRESS_EWMA_ALPHA * (0.0 if ok else 1.0)
+        if ok:
+            member.latency = latency if member.latency is None else (1 - EGRESS_EWMA_ALPHA) * member.latency + EGRESS_EWMA_ALPHA * latency
+            member.consecutive_failures = 0
+            member.ejections = 0
+            return
+        member.failures += 1
+        member.consecutive_failures += 1
+        if member.consecutive_failures >= EGRESS_EJECT_AFTER_FAILURES:
+            cool_down = min(EGRESS_EJECT_SECONDS * 2 ** member.ejections, EGRESS_MAX_EJECT_SECONDS)
+            member.ejected_until = time.monotonic() + cool_down
+            member.ejections += 1
+            member.consecutive_failures = 0
+            logging.warning(f"Ejecting egress {member.name} for {cool_down}s")
+
+    def stats(self):
+        return {member.name: member.stats() for member in self.members}
+
+
+def _masked(key: str) -> str:
+    return key[:4] + "..."
+
+def pool_from_env() -> EgressPool:
+    """
+    Build the pool from the environment:
+    EGRESS_DIRECT (default true), EGRESS_PROXIES=http://host:port,... and SCRAPING_BEE_KEYS=key1,key2,...
+    """
+    members = []
+    if os.getenv("EGRESS_DIRECT", "true").lower() != "false":
+        members.append(EgressMember("direct"))
+    for proxy in filter(None, (p.strip() for p in os.getenv("EGRESS_PROXIES", "").split(","))):
+        parts = urlsplit(proxy)
+        members.append(EgressMember(f"proxy:{parts.hostname}:{parts.port}", proxy=proxy))
+    for key in filter(None, (k.strip() for k in os.getenv("SCRAPING_BEE_KEYS", "").split(","))):
+        members.append(EgressMember(f"scrapingbee:{_masked(key)}", scraping_bee_key=key))
+    return EgressPool(members)
+
+
+egress_pool = pool_from_env()
@@ -0,0 +1,146 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from src.utils.constants import FEED_CACHE_TTL_SECONDS, FEED_CACHE_STALE_SECONDS, FEED_CACHE_MAX_FEEDS, FEED_CACHE_MAX_ARTICLES
+
+
+# Set by the prefetch scheduler: lookups made inside FeedCache.prefetching() refresh entries instead of reading them
+_prefetch_refresh_within = contextvars.ContextVar("prefetch_refresh_within", default=None)
+
+
+class _CacheEntry:
+    __slots__ = ('value', 'fetched_at', 'weight')
+
+    def __init__(self, value, fetched_at, weight):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.weight = weight
+
+
+class FeedCache:
+    """
+    In-process cache of parsed feeds keyed by canonical feed URL.
+
+    - Entries younger than `ttl` are served as-is.
+    - Entries younger than `stale_ttl` are served immediately while one background task refreshes them.
+    - Older entries are refreshed inline, but are still served if the upstream fetch fails.
+    - Concurrent misses for the same key share a single in-flight fetch.
+    - Eviction is LRU, bounded both by number of feeds and by total number of cached articles.
+    - Lookups made by the prefetch scheduler are counted apart, so the hit counters reflect what users see.
+    """
+
+    def __init__(self, ttl = FEED_CACHE_TTL_SECONDS, stale_ttl = FEED_CACHE_STALE_SECONDS, max_feeds = FEED_CACHE_MAX_FEEDS, max_articles = FEED_CACHE_MAX_ARTICLES):
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.max_feeds = max_feeds
+        self.max_articles = max_articles
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._background = set()
+        self._total_weight = 0
+        self._stats = {"hits": 0, "misses": 0, "stale_hits": 0, "stale_on_error": 0, "coalesced": 0, "refresh_errors": 0, "evictions": 0,
+                       "prefetch_refreshes": 0, "prefetch_skipped": 0}
+
+    @contextmanager
+    def prefetching(self, refresh_within):
+        """Within this block, lookups refetch any entry that would expire in less than `refresh_within` seconds"""
+        token = _prefetch_refresh_within.set(refresh_within)
+        try:
+            yield
+        finally:
+            _prefetch_refresh_within.reset(token)
+
+    async def get_or_fetch(self, key, fetch):
+        """Return the cached value for key, calling the zero-argument coroutine function `fetch` when needed"""
+        refresh_within = _prefetch_refresh_within.get()
+        if refresh_within is not None:
+            return await self._prefetch(key, fetch, refresh_within)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            self._entries.move_to_end(key)
+            if age < self.ttl:
+                self._stats["hits"] += 1
+                return entry.value
+            if age < self.stale_ttl:
+                self._stats["stale_hits"] += 1
+                self._refresh_in_background(key, fetch)
+                return entry.value
+
+        self._stats["misses"] += 1
+        try:
+            return await self._fetch_once(key, fetch)
+        except Exception:
+            entry = self._entries.get(key)
+            if entry is None:
+                raise
+            self._stats["stale_on_error"] += 1
+            logging.warning(f"Serving stale feed for {key} after upstream error")
+            return entry.value
+
+    def put(self, key, value):
+        """Store a freshly fetched value, evicting least recently used feeds when over budget"""
+        weight = len(value.get("entries", ())) if isinstance(value, dict) else 1
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._total_weight -= old.weight
+        self._entries[key] = _CacheEntry(value, time.monotonic(), weight)
+        self._total_weight += weight
+        while len(self._entries) > 1 and (len(self._entries) > self.max_feeds or self._total_weight > self.max_articles):
+            _, evicted = self._entries.popitem(last=False)
+            self._total_weight -= evicted.weight
+            self._stats["evictions"] += 1
+
+    def stats(self):
+        served = self._stats["hits"] + self._stats["stale_hits"]
+        lookups = served + self._stats["misses"]
+        return {**self._stats, "interactive_hit_rate": round(served / lookups, 3) if lookups else None,
+                "feeds": len(self._entries), "articles": self._total_weight, "inflight": len(self._inflight)}
+
+    async def _prefetch(self, key, fetch, refresh_within):
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.fetched_at < self.ttl - refresh_within:
+            self._stats["prefetch_skipped"] += 1
+            return entry.value
+        self._stats["prefetch_refreshes"] += 1
+        return await self._fetch_once(key, fetch)
+
+    async def _fetch_once(self, key, fetch):
+        task = self._inflight.get(key)
+        if task is not None:
+            self._stats["coalesced"] += 1
+        else:
+            task = asyncio.ensure_future(self._run_fetch(key, fetch))
+            self._inflight[key] = task
+        # Shield so that one cancelled waiter does not cancel the fetch shared with the others
+        return await asyncio.shield(task)
+
+    async def _run_fetch(self, key, fetch):
+        try:
+            value = await fetch()
+            self.put(key, value)
+            return value
+        except Exception:
+            self._stats["refresh_errors"] += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _refresh_in_background(self, key, fetch):
+        if key in self._inflight:
+            return
+        task = asyncio.ensure_future(self._fetch_once(key, fetch))
+        self._background.add(task)
+        task.add_done_callback(self._background_done)
+
+    def _background_done(self, task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.warning(f"Background feed refresh failed: {task.exception()}")
+
+
+feed_cache = FeedCache()
@@ -1,57 +1,16 @@
+import calendar
 import datetime
 from datetime import datetime, timedelta, date
 import json
 import io
+from functools import lru_cache
 from src.utils.constants import parse_command_for_args_pattern
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import inch
-from reportlab.lib import colors
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-# Only keeps the articles that were published within num_days of days, default value is 1
-def filter_recent_articles(articles, num_days = 1):
-  # Current date and time
-  current_date = datetime.now()
-
-  # Define the timedelta for 1 day
-  days_back = timedelta(days=num_days)
-  filtered_articles = []
-  for article in articles:
-    # Convert published_parsed to datetime
-    published_date = datetime(*article['published_parsed'][:6])  # Extract year, month, day, hour, min, sec
-
-    # Check if published date is within 1 day of the current date
-    if current_date - published_date <= days_back:
-        filtered_articles.append(article)
-
-  return filtered_articles
-
-# Only return the title, link and published date of the entry
-def extract_title_link_date(entry):
-  title = entry['title']
-  published_parsed = entry['published_parsed']
-  # dt = datetime(*published_parsed[:6])
-  # date = dt.strftime('%d %b %Y')
-  link = entry['link']
-  return {'title':title, 'published_parsed': published_parsed, 'link': link}
-
-# Getting a list of unique entries from a list of entries
-def get_unique_list(entry_list):
-  unique_entries = {}
-  for entry in entry_list:
-    # print(entry)
-    title = entry['title']
-    clean_title = title.rpartition('-')[0].strip()
-    if clean_title not in unique_entries:
-      unique_entries[clean_title] = entry
-  unique_entries_list = list(unique_entries.values())
-  return unique_entries_list
-
-
-def convert_timestruct_to_datestring(timestruct):
-  dt = datetime(*timestruct[:6])
-  datestring = dt.strftime('%d %b %Y')
-  return datestring
+# Epoch seconds before which articles are older than num_days. Published times are UTC but, as before, are
+# compared against the local wall clock
+def recent_cutoff_timestamp(num_days = 1):
+  cutoff = datetime.now() - timedelta(days=num_days)
+  return calendar.timegm(cutoff.timetuple()) + cutoff.microsecond / 1_000_000
 
 
 # Functions for retrieving data, to be replaced by API calls
@@ -70,8 +29,12 @@ def get_topics():
         
     return topics
   
-# Turning a list of entries (title, link, date) into a pdf file in memory
+# Turning a list of Articles into a pdf file in memory
 def to_pdf_from_entries(entry_list, file_title)-> io.BytesIO:
+  # reportlab is slow to import, load it on the first render (or in the startup warm-up) instead of at import time
+  from reportlab.pdfgen import canvas
+  from reportlab.lib.pagesizes import A4
+  from reportlab.lib.units import inch
   pdf_buffer = io.BytesIO()
   c = canvas.Canvas(pdf_buffer, pagesize=A4)
   
@@ -79,12 +42,26 @@ def to_pdf_from_entries(entry_list, file_title)-> io.BytesIO:
   c.setFont("Times-Bold", 18) 
   c.drawCentredString(width / 2, height - 1 * inch, file_title)
   
-  y_pos = height - 1.5 * inch
+  draw_entries(c, entry_list, height - 1.5 * inch)
+  
+  c.showPage()
+  c.save()
+  
+  pdf_buffer.seek(0)
+  return pdf_buffer
+
+# Draw the entries (title (date) and a Link) from y_pos down, continuing on new pages, returns the y position below them
+def draw_entries(c, entry_list, y_pos):
+  from reportlab.lib.pagesizes import A4
+  from reportlab.lib.units import inch
+  from reportlab.lib import colors
+  width, height = A4
   max_title_width = width - 2*inch
   x_pos = width / 2 - max_title_width / 2
   c.setFont("Times-Roman", 12)
+  link_width = c.stringWidth("Link", "Times-Roman", 12)
   for entry in entry_list:
-    title, date, link = entry["title"], entry["date"], entry["link"]
+    title, date, link = entry.title, entry.date, entry.link
 
     y_pos = wrap_text(c, f"{title} ({date})", width / 2 - max_title_width / 2, y_pos, max_title_width)
     
@@ -93,7 +70,6 @@ def to_pdf_from_entries(entry_list, file_title)-> io.BytesIO:
     c.drawString(x_pos, y_pos, "Link")
     
     # Add the underline for hyperlink text
-    link_width = c.stringWidth("Link", "Times-Roman", 12)
     c.line(x_pos, y_pos - 1.2, x_pos + link_width, y_pos - 1.2)
     
     # Add hyperlink annotation
@@ -106,55 +82,120 @@ def to_pdf_from_entries(entry_list, file_title)-> io.BytesIO:
       c.showPage()
       c.setFont("Times-Roman", 12)
       y_pos = height - 1 * inch
-  
+  return y_pos
+
+# Several feeds in one pdf: a contents page linking to a section per feed, each section also bookmarked in the
+# pdf outline. sections are (section title, entries, note), the note is listed instead when entries is empty
+def to_pdf_from_sections(sections, file_title)-> io.BytesIO:
+  from reportlab.pdfgen import canvas
+  from reportlab.lib.pagesizes import A4
+  from reportlab.lib.units import inch
+  from reportlab.lib import colors
+  pdf_buffer = io.BytesIO()
+  c = canvas.Canvas(pdf_buffer, pagesize=A4)
+  width, height = A4
+  x_pos = 1 * inch
+  max_line_width = width - 2 * inch
+  c.setFont("Times-Bold", 18)
+  c.drawCentredString(width / 2, height - 1 * inch, fit_text(file_title, "Times-Bold", 18, max_line_width))
+  c.setFont("Times-Bold", 14)
+  c.drawString(x_pos, height - 1.5 * inch, "Contents")
+  y_pos = height - 1.5 * inch - 24
+
+  # Contents: links to named destinations, which are only bookmarked further down, all in the same pass.
+  # Long saved queries are wrapped like entry titles, the link covering every line
+  for number, (section_title, entries, note) in enumerate(sections, start=1):
+    if entries:
+      c.setFillColor(colors.blue)
+      below, line_width = wrap_text(c, f"{number}. {section_title} ({len(entries)} article{'s' if len(entries) != 1 else ''})", x_pos, y_pos, max_line_width, with_width=True)
+      # Only the drawn text is clickable, not the empty rest of the line
+      c.linkAbsolute(section_title, f"section-{number}", (x_pos, below + 14 - 2, x_pos + line_width, y_pos + 10))
+    else:
+      c.setFillColor(colors.grey)
+      below = wrap_text(c, f"{number}. {section_title}: {note}", x_pos, y_pos, max_line_width)
+    c.setFillColor(colors.black)
+    y_pos = below - 4
+    if y_pos < 1 * inch:
+      c.showPage()
+      y_pos = height - 1 * inch
+
+  for number, (section_title, entries, _) in enumerate(sections, start=1):
+    if not entries:
+      continue
+    # Every section starts on a new page, so the contents and the outline point at a page top
+    c.showPage()
+    key = f"section-{number}"
+    c.bookmarkPage(key, fit="XYZ", top=height, left=0)
+    c.addOutlineEntry(f"{section_title} ({len(entries)})", key, level=0)
+    c.setFont("Times-Bold", 18)
+    c.drawCentredString(width / 2, height - 1 * inch, fit_text(section_title, "Times-Bold", 18, max_line_width))
+    draw_entries(c, entries, height - 1.5 * inch)
+
+  c.showOutline()
   c.showPage()
   c.save()
-  
+
   pdf_buffer.seek(0)
   return pdf_buffer
 
+# Widths of Times-Roman text in glyph units (1/1000 of the font size). Glyph widths are integers and stringWidth
+# returns their sum * 0.001 * size, so summing the units of words and spaces and scaling the same way gives
+# exactly the width stringWidth would measure for the whole line
+@lru_cache(maxsize=1 << 15)
+def _text_units(text: str) -> int:
+  from reportlab.pdfbase.pdfmetrics import stringWidth
+  return round(stringWidth(text, "Times-Roman", 1000))
+
+# Shorten a single-line heading to max_width with an ellipsis
+def fit_text(text, font_name, font_size, max_width):
+  from reportlab.pdfbase.pdfmetrics import stringWidth
+  if stringWidth(text, font_name, font_size) <= max_width:
+    return text
+  while text and stringWidth(text + "…", font_name, font_size) > max_width:
+    text = text[:-1]
+  return text.rstrip() + "…"
+
 # To wrap text in case that they are too long 
-def wrap_text(c, text, x, y, max_width):
-    """Function to wrap text manually based on the maximum width allowed."""
+def wrap_text(c, text, x, y, max_width, with_width=False):
+    """Function to wrap text manually based on the maximum width allowed. With with_width, also returns the width of the widest line."""
     # Create a TextObject
     text_object = c.beginText(x, y)
     text_object.setFont("Times-Roman", 12)
-    # Set the width limit for the text
+    space_units = _text_units(" ")
     lines = []
-    current_line = ""
+    line_words = []
+    line_units = 0
+    widest_units = 0
     for word in text.split():
-        # Check if adding the next word exceeds the max width
-        if c.stringWidth(current_line + " " + word, "Times-Roman", 12) <= max_width:
-            current_line += " " + word if current_line else word
+        word_units = _text_units(word)
+        # Same test as measuring current_line + " " + word, including the leading space when the line is still empty
+        if (line_units + space_units + word_units) * 0.001 * 12 <= max_width:
+            line_units = line_units + space_units + word_units if line_words else word_units
+            line_words.append(word)
         else:
             # If it exceeds, add the current line to lines and start a new line
-            lines.append(current_line)
-            current_line = word
+            lines.append(" ".join(line_words))
+            widest_units = max(widest_units, line_units)
+            line_words = [word]
+            line_units = word_units
     # Add the last line
-    lines.append(current_line)
+    lines.append(" ".join(line_words))
+    widest_units = max(widest_units, line_units)
     
     # Add lines to the text object
-    for line in lines:
-        text_object.textLine(line)
+    text_object.textLines(lines)
     
     # Draw the text object on the canvas
     c.drawText(text_object)
     
     # Return the new y position after drawing the text
-    return y - ((len(lines)) * 14)  # Adjust spacing as needed
+    below = y - ((len(lines)) * 14)  # Adjust spacing as needed
+    return (below, widest_units * 0.001 * 12) if with_width else below
 
 def get_current_date():
   today = date.today().strftime("%d-%m-%Y")
   return today
 
-def sort_by_date(to_sort_list, order = 'desc'):
-  if order == 'asc':
-    list_sorted_by_date = sorted(to_sort_list, key=lambda x: x['published_parsed'])
-  else:
-    list_sorted_by_date = sorted(to_sort_list, key=lambda x: x['published_parsed'], reverse=True)
-  
-  return list_sorted_by_date
-
 import re
 
 def extract_flags(command_text, flags_to_extract):
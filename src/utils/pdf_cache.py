@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from hashlib import blake2b
+from src.utils.constants import PDF_CACHE_MAX_BYTES, PDF_CACHE_SPILL_MAX_BYTES
+
+# Rendered PDFs keyed by the content they were rendered from: the same title and (title, date, link) entries always
+# give the same document, so /top_news for a country or a public topic is rendered once however many users ask for it.
+# Documents evicted from memory can be spilled to a directory, which also keeps them across restarts.
+
+
+def document_key(entries: list, file_title: str) -> str:
+    """Hash of the document title and the (title, date, link) of every entry"""
+    digest = blake2b(file_title.encode(), digest_size=20)
+    for entry in entries:
+        for field in entry:
+            digest.update(b'\x00' + field.encode())
+        digest.update(b'\x01')
+    return digest.hexdigest()
+
+
+class PdfCache:
+    """Byte-bounded LRU of rendered documents in memory, with an optional byte-bounded spill directory behind it"""
+
+    def __init__(self, max_bytes = PDF_CACHE_MAX_BYTES, spill_dir = None, spill_max_bytes = PDF_CACHE_SPILL_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self._documents = OrderedDict()
+        self._bytes = 0
+        self._spilled = OrderedDict()  # key -> size, oldest first
+        self._spilled_bytes = 0
+        self._spill_lock = asyncio.Lock()  # one spill thread at a time, they share the spilled index
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "spills": 0, "spill_errors": 0}
+        if spill_dir:
+            self._scan_spill_dir()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, f"{key}.pdf")
+
+    def _scan_spill_dir(self):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.spill_dir):
+            if entry.name.endswith('.pdf') and entry.is_file():
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name.removesuffix('.pdf'), stat.st_size))
+        for _, key, size in sorted(files):
+            self._spilled[key] = size
+            self._spilled_bytes += size
+        self._trim_spilled()
+
+    async def get(self, key: str):
+        """The cached document, or None"""
+        document = self._documents.get(key)
+        if document is not None:
+            self._documents.move_to_end(key)
+            self._stats["memory_hits"] += 1
+            return document
+        if key in self._spilled:
+            try:
+                document = await asyncio.to_thread(self._read, key)
+            except OSError as e:
+                logging.warning(f"Could not read spilled PDF {key}: {e}")
+                async with self._spill_lock:
+                    self._forget_spilled(key)
+            else:
+                self._stats["disk_hits"] += 1
+                await self.put(key, document)
+                return document
+        self._stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, document: bytes):
+        if key in self._documents:
+            self._documents.move_to_end(key)
+            return
+        if len(document) > self.max_bytes:
+            return
+        self._documents[key] = document
+        self._bytes += len(document)
+        evicted = []
+        while self._bytes > self.max_bytes:
+            evicted_key, evicted_document = self._documents.popitem(last=False)
+            self._bytes -= len(evicted_document)
+            evicted.append((evicted_key, evicted_document))
+        if self.spill_dir and evicted:
+            async with self._spill_lock:
+                await asyncio.to_thread(self._spill, evicted)
+
+    def _read(self, key: str) -> bytes:
+        with open(self._path(key), 'rb') as f:
+            return f.read()
+
+    def _spill(self, documents: list):
+        for key, document in documents:
+            if key in self._spilled:
+                continue
+            try:
+                # Written under a temporary name and renamed, so a reader never sees a partial file
+                temporary = self._path(key) + '.tmp'
+                with open(temporary, 'wb') as f:
+                    f.write(document)
+                os.replace(temporary, self._path(key))
+            except OSError as e:
+                self._stats["spill_errors"] += 1
+                logging.warning(f"Could not spill PDF {key}: {e}")
+                continue
+            self._spilled[key] = len(document)
+            self._spilled_bytes += len(document)
+            self._stats["spills"] += 1
+        self._trim_spilled()
+
+    def _trim_spilled(self):
+        while self._spilled_bytes > self.spill_max_bytes:
+            oldest = next(iter(self._spilled))
+            try:
+                os.remove(self._path(oldest))
+            except OSError:
+                pass
+            self._forget_spilled(oldest)
+
+    def _forget_spilled(self, key: str):
+        self._spilled_bytes -= self._spilled.pop(key, 0)
+
+    def stats(self):
+        hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+        lookups = hits + self._stats["misses"]
+        return {**self._stats, "hit_rate": round(hits / lookups, 3) if lookups else None,
+                "documents": len(self._documents), "bytes": self._bytes,
+                "spilled_documents": len(self._spilled), "spilled_bytes": self._spilled_bytes}
+
+
+def cache_from_env() -> PdfCache:
+    """PDF_CACHE_MAX_MB, PDF_CACHE_SPILL_DIR (no spilling when unset) and PDF_CACHE_SPILL_MAX_MB"""
+    max_bytes = int(float(os.getenv("PDF_CACHE_MAX_MB", PDF_CACHE_MAX_BYTES / 2 ** 20)) * 2 ** 20)
+    spill_max_bytes = int(float(os.getenv("PDF_CACHE_SPILL_MAX_MB", PDF_CACHE_SPILL_MAX_BYTES / 2 ** 20)) * 2 ** 20)
+    spill_dir = os.getenv("PDF_CACHE_SPILL_DIR") or None
+    try:
+        return PdfCache(max_bytes, spill_dir, spill_max_bytes)
+    except OSError as e:
+        logging.warning(f"PDF spill directory {spill_dir} unusable, caching in memory only: {e}")
+        return PdfCache(max_bytes)
+
+
+pdf_cache = cache_from_env()
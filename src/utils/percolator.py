@@ -0,0 +1,201 @@
+import time
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit
+from src.utils.article import Article
+from src.utils.search_query import QueryClause, compile_clauses, words
+from src.utils.constants import ALERT_MAX_ARTICLE_AGE_SECONDS, ALERT_MAX_PENDING_ARTICLES
+
+# Reverse search for breaking-news alerts: instead of running every saved query against Google, every newly fetched
+# article is run against all saved queries at once. Each query clause is indexed under one required phrase (its anchor)
+# in a word-level Aho-Corasick automaton, so one pass over a headline finds the few clauses that can possibly match,
+# and only those are verified in full.
+
+
+class PhraseAutomaton:
+    """Aho-Corasick automaton over words: one pass over a word sequence reports the values of every phrase in it"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._values = [[]]
+        self._output_link = [0]  # nearest state down the fail chain with values of its own, 0 when none
+
+    def add(self, phrase: tuple, value):
+        state = 0
+        for word in phrase:
+            next_state = self._goto[state].get(word)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][word] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._values.append([])
+                self._output_link.append(0)
+            state = next_state
+        self._values[state].append(value)
+
+    def build(self):
+        """Compute the fail links, once every phrase is added"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(word, 0)
+                self._fail[child] = fail
+                self._output_link[child] = fail if self._values[fail] else self._output_link[fail]
+                queue.append(child)
+
+    def scan(self, text: tuple):
+        goto, fail, values, output_link = self._goto, self._fail, self._values, self._output_link
+        state = 0
+        for word in text:
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            found = state
+            while found:
+                yield from values[found]
+                found = output_link[found]
+
+
+def _padded(phrase: tuple) -> str:
+    return ' ' + ' '.join(phrase) + ' '
+
+
+def _on_site(host: str, site: str) -> bool:
+    return host == site or host.endswith('.' + site)
+
+
+class _Clause:
+    __slots__ = ('query', 'phrases', 'excluded', 'sites', 'excluded_sites', 'titles', 'excluded_titles')
+
+    def __init__(self, query: int, clause: QueryClause):
+        self.query = query
+        self.phrases = [_padded(phrase) for phrase in clause.phrases]
+        self.excluded = [_padded(phrase) for phrase in clause.excluded]
+        self.sites = clause.sites
+        self.excluded_sites = clause.excluded_sites
+        self.titles = [_padded(phrase) for phrase in clause.titles]
+        self.excluded_titles = [_padded(phrase) for phrase in clause.excluded_titles]
+
+    def matches(self, text: str, title: str, host: str) -> bool:
+        return (all(phrase in text for phrase in self.phrases)
+                and all(phrase in title for phrase in self.titles)
+                and not any(phrase in text for phrase in self.excluded)
+                and not any(phrase in title for phrase in self.excluded_titles)
+                and (not self.sites or any(_on_site(host, site) for site in self.sites))
+                and not any(_on_site(host, site) for site in self.excluded_sites))
+
+
+class Percolator:
+    """
+    All saved queries compiled into one matcher. Queries compiling to the same clauses are grouped, so a query saved
+    by many users is checked once per article. A clause is anchored on its longest required phrase (headline phrases
+    included); clauses made only of site: filters are looked up by the article's publisher domain instead.
+    Queries using operators that need Google (AROUND, wildcards, inurl: ...) are skipped.
+    """
+
+    def __init__(self, saved_queries):
+        """saved_queries: iterable of (subscriber, query text)"""
+        self.queries = []  # (query text, [subscribers])
+        self._query_index = {}  # compiled clauses -> index in self.queries
+        compiled = {}
+        self._clauses = []
+        self._by_site = {}
+        self._automaton = PhraseAutomaton()
+        self.skipped = 0
+        for subscriber, query in saved_queries:
+            if query not in compiled:
+                compiled[query] = compile_clauses(query)
+            clauses = compiled[query]
+            if clauses is None:
+                self.skipped += 1
+                continue
+            index = self._query_index.get(clauses)
+            if index is None:
+                index = self._query_index[clauses] = len(self.queries)
+                self.queries.append((query.strip(), []))
+                for clause in clauses:
+                    self._add_clause(index, clause)
+            self.queries[index][1].append(subscriber)
+        self._automaton.build()
+
+    def _add_clause(self, query: int, clause: QueryClause):
+        clause_id = len(self._clauses)
+        self._clauses.append(_Clause(query, clause))
+        required = clause.phrases + clause.titles
+        if required:
+            self._automaton.add(max(required, key=lambda phrase: (len(phrase), sum(map(len, phrase)))), clause_id)
+        else:
+            for site in clause.sites:
+                self._by_site.setdefault(site, []).append(clause_id)
+
+    def match(self, article: Article) -> list[tuple[str, list]]:
+        """(query text, subscribers) of every saved query the article matches"""
+        title_words = words(article.title)
+        text_words = title_words + words(article.publisher) if article.publisher else title_words
+        host = (urlsplit(article.publisher_url).hostname or '').removeprefix('www.') if article.publisher_url else ''
+        candidates = set(self._automaton.scan(text_words))
+        if self._by_site and host:
+            labels = host.split('.')
+            for i in range(len(labels)):
+                candidates.update(self._by_site.get('.'.join(labels[i:]), ()))
+        if not candidates:
+            return []
+        text, title = _padded(text_words), _padded(title_words)
+        matched = set()
+        for clause_id in candidates:
+            clause = self._clauses[clause_id]
+            if clause.query not in matched and clause.matches(text, title, host):
+                matched.add(clause.query)
+        return [self.queries[query] for query in matched]
+
+    def __len__(self):
+        return len(self.queries)
+
+
+class NewArticles:
+    """
+    Articles fetched for the first time since startup and published recently, waiting to be percolated.
+    Bounded on both sides: the links already offered are remembered up to a limit, and when the alert dispatcher
+    falls behind the oldest pending articles are dropped.
+    """
+
+    def __init__(self, enabled = False, max_pending = ALERT_MAX_PENDING_ARTICLES, max_age = ALERT_MAX_ARTICLE_AGE_SECONDS):
+        self.enabled = enabled
+        self.max_age = max_age
+        self._pending = deque(maxlen=max_pending)
+        self._offered = OrderedDict()
+        self._max_offered = 4 * max_pending
+        self._stats = {"offered": 0, "queued": 0, "dropped": 0}
+
+    def offer(self, articles: list[Article]):
+        """Called with every fetched feed, cheap enough to run on the fetch path"""
+        if not self.enabled:
+            return
+        cutoff = time.time() - self.max_age
+        for article in articles:
+            self._stats["offered"] += 1
+            if article.link in self._offered or article.published < cutoff:
+                continue
+            self._offered[article.link] = None
+            if len(self._offered) > self._max_offered:
+                self._offered.popitem(last=False)
+            if len(self._pending) == self._pending.maxlen:
+                self._stats["dropped"] += 1
+            self._pending.append(article)
+            self._stats["queued"] += 1
+
+    def drain(self) -> list[Article]:
+        articles = list(self._pending)
+        self._pending.clear()
+        return articles
+
+    def stats(self):
+        return {**self._stats, "pending": len(self._pending)}
+
+
+new_articles = NewArticles()
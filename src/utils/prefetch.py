@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import random
+import time
+from src.models import make_gn_object
+from src.database.database import get_db
+import src.database.crud as crud
+from src.utils.feed_cache import feed_cache
+from src.utils.coalesce import canonical_topic_hash
+from src.utils.constants import countries_available, PUBLIC_TOPICS, PREFETCH_INTERVAL_SECONDS, PREFETCH_MAX_FEEDS, PREFETCH_SAVED_TOPICS, PREFETCH_PRIME_FEEDS
+from src.utils.startup import readiness
+
+# Feeds are identified as (kind, topic_hash, country_code), kind being 'top' or 'topic'
+
+async def popular_feeds() -> list[tuple]:
+    """Rank feeds to keep warm: most saved topics first, then top news and public topics for every country"""
+    saved = []
+    try:
+        async with get_db() as db:
+            saved = await crud.get_most_saved_topics(db, limit=PREFETCH_SAVED_TOPICS)
+    except Exception as e:
+        logging.warning(f"Could not rank saved topics for prefetching: {e}")
+
+    feeds = [('topic', topic_hash, country_code) for topic_hash, country_code, _ in saved]
+    feeds += [('top', None, country_code) for country_code in countries_available.values()]
+    feeds += [('topic', topic_hash, country_code) for topic_hash in PUBLIC_TOPICS.values() for country_code in countries_available.values()]
+
+    ranked = []
+    seen = set()
+    for kind, topic_hash, country_code in feeds:
+        key = (kind, canonical_topic_hash(topic_hash) if topic_hash else None, country_code)
+        if key not in seen:
+            seen.add(key)
+            ranked.append(key)
+    return ranked[:PREFETCH_MAX_FEEDS]
+
+async def prefetch_feed(kind: str, topic_hash: str, country_code: str):
+    gn = make_gn_object(country=country_code)
+    with feed_cache.prefetching(refresh_within=PREFETCH_INTERVAL_SECONDS):
+        if kind == 'top':
+            await gn.top_news()
+        else:
+            await gn.topic_headlines(topic_hash)
+
+async def run_prefetch_cycle():
+    feeds = await popular_feeds()
+    # Spread the requests over most of the interval, with jitter, instead of sending them in a burst
+    spacing = PREFETCH_INTERVAL_SECONDS * 0.8 / max(len(feeds), 1)
+    failures = 0
+    for feed in feeds:
+        await asyncio.sleep(spacing * random.uniform(0.5, 1.5))
+        try:
+            await prefetch_feed(*feed)
+        except Exception as e:
+            failures += 1
+            logging.warning(f"Prefetch of {feed} failed: {e}")
+    return len(feeds), failures
+
+async def prime_feed_cache():
+    """Fetch the most popular feeds at once, without the spacing of a cycle, then report the feed cache as primed"""
+    started = time.perf_counter()
+    feeds = (await popular_feeds())[:PREFETCH_PRIME_FEEDS]
+    results = await asyncio.gather(*(prefetch_feed(*feed) for feed in feeds), return_exceptions=True)
+    failures = sum(isinstance(result, Exception) for result in results)
+    # Primed even if some feeds failed, those are fetched on demand, an unreachable Google News should not keep the app unready
+    readiness["caches"] = True
+    logging.info(f"Feed cache primed with {len(feeds) - failures}/{len(feeds)} feeds in {time.perf_counter() - started:.2f}s")
+
+async def run_prefetch_scheduler():
+    """Prime the feed cache, then refresh popular feeds every PREFETCH_INTERVAL_SECONDS for as long as the app runs"""
+    try:
+        await prime_feed_cache()
+    except Exception as e:
+        readiness["caches"] = True
+        logging.error(f"Priming the feed cache crashed: {e}")
+    while True:
+        started = time.monotonic()
+        try:
+            feed_count, failures = await run_prefetch_cycle()
+            stats = feed_cache.stats()
+            logging.info(
+                f"Prefetch cycle: {feed_count} feeds, {failures} failed, {stats['prefetch_refreshes']} refreshes so far, "
+                f"interactive hit rate {stats['interactive_hit_rate']} ({stats['hits'] + stats['stale_hits']} hits / {stats['misses']} misses)"
+            )
+        except Exception as e:
+            logging.error(f"Prefetch cycle crashed: {e}")
+        await asyncio.sleep(max(0.0, PREFETCH_INTERVAL_SECONDS - (time.monotonic() - started)))
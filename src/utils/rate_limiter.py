@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import httpx
+from src.utils.constants import RATE_LIMITS, DEFAULT_RATE_LIMIT, RETRY_STATUS_CODES, MAX_FETCH_RETRIES, BACKOFF_BASE_SECONDS, BACKOFF_MAX_SECONDS, MAX_RETRY_AFTER_SECONDS
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average with bursts of up to `burst` requests"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        # Set when the host answers 429/503, every request waits until then
+        self.blocked_until = 0.0
+        self.waiting = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> bool:
+        """Wait for a token, returns True if the caller had to queue"""
+        queued = False
+        self.waiting += 1
+        try:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    delay = self.blocked_until - now
+                    if delay <= 0 and self.tokens >= 1:
+                        self.tokens -= 1
+                        return queued
+                    queued = True
+                    await asyncio.sleep(max(delay, (1 - self.tokens) / self.rate))
+        finally:
+            self.waiting -= 1
+
+    def block_for(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class HostRateLimiter:
+    """One token bucket per upstream host, shared by every fetch in the process"""
+
+    def __init__(self, limits: dict, default: tuple):
+        self.limits = limits
+        self.default = default
+        self._buckets = {}
+        self._stats = {}
+
+    def bucket(self, host: str, egress: str = None) -> TokenBucket:
+        """Budgets are per host and per egress path, since each proxy or ScrapingBee key is throttled separately upstream"""
+        key = host if not egress else f"{host}@{egress}"
+        if key not in self._buckets:
+            rate, burst = self.limits.get(host, self.default)
+            self._buckets[key] = TokenBucket(rate, burst)
+            self._stats[key] = {"requests": 0, "queued": 0, "throttled": 0, "retries": 0, "errors": 0}
+        return self._buckets[key]
+
+    def _counts(self, host, egress):
+        return self._stats[host if not egress else f"{host}@{egress}"]
+
+    async def acquire(self, host: str, egress: str = None):
+        bucket = self.bucket(host, egress)
+        queued = await bucket.acquire()
+        self._counts(host, egress)["requests"] += 1
+        if queued:
+            self._counts(host, egress)["queued"] += 1
+
+    def throttled(self, host: str, seconds: float, egress: str = None):
+        self.bucket(host, egress).block_for(seconds)
+        self._counts(host, egress)["throttled"] += 1
+
+    def record(self, host: str, key: str, egress: str = None):
+        self.bucket(host, egress)
+        self._counts(host, egress)[key] += 1
+
+    def stats(self):
+        return {key: {**counts, "waiting": self._buckets[key].waiting} for key, counts in self._stats.items()}
+
+
+def parse_retry_after(value):
+    """Return the delay in seconds from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def _limits_from_env():
+    """Parse RATE_LIMITS=host=rate:burst,host=rate:burst on top of the defaults in constants"""
+    limits = dict(RATE_LIMITS)
+    for item in filter(None, os.getenv("RATE_LIMITS", "").split(",")):
+        try:
+            host, budget = item.split("=")
+            rate, burst = budget.split(":")
+            limits[host.strip()] = (float(rate), int(burst))
+        except ValueError:
+            logging.warning(f"Ignoring malformed RATE_LIMITS entry: {item}")
+    return limits
+
+
+rate_limiter = HostRateLimiter(_limits_from_env(), DEFAULT_RATE_LIMIT)
+
+
+async def get_with_backoff(client: httpx.AsyncClient, url: str, egress: str = None, **kwargs) -> httpx.Response:
+    """
+    GET url through the shared per-host (and per-egress) rate limiter.
+    429/503 responses and transport errors are retried with jittered exponential backoff, honouring Retry-After.
+    """
+    host = urlsplit(url).hostname
+    for attempt in range(MAX_FETCH_RETRIES + 1):
+        await rate_limiter.acquire(host, egress)
+        try:
+            response = await client.get(url, **kwargs)
+        except httpx.TransportError:
+            rate_limiter.record(host, "errors", egress)
+            if attempt == MAX_FETCH_RETRIES:
+                raise
+            await asyncio.sleep(backoff_delay(attempt))
+            rate_limiter.record(host, "retries", egress)
+            continue
+
+        if response.status_code not in RETRY_STATUS_CODES:
+            return response
+
+        delay = parse_retry_after(response.headers.get("Retry-After"))
+        if delay is None:
+            delay = backoff_delay(attempt)
+        delay = min(delay, MAX_RETRY_AFTER_SECONDS)
+        # Everyone fetching from this host waits, not only this request
+        rate_limiter.throttled(host, delay, egress)
+        if attempt == MAX_FETCH_RETRIES:
+            return response
+        logging.warning(f"{host} answered {response.status_code}, retrying in {delay:.1f}s")
+        rate_limiter.record(host, "retries", egress)
+    return response
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple
+from src.utils.pdf_cache import pdf_cache, document_key
+from src.utils.constants import RENDER_EXECUTOR, RENDER_MAX_QUEUE, RENDER_TIMEOUT_SECONDS
+
+
+class RenderBusy(Exception):
+    """Raised instead of queueing when every worker is busy and the queue is full"""
+
+
+class _Entry(NamedTuple):
+    # What to_pdf_from_entries reads from an Article, so summaries are not pickled to the workers
+    title: str
+    date: str
+    link: str
+
+
+def _render(entries: list, file_title: str) -> bytes:
+    import src.utils.helper_functions as hf
+    return hf.to_pdf_from_entries([_Entry(*entry) for entry in entries], file_title).getvalue()
+
+
+def _render_sections(sections: list, file_title: str) -> bytes:
+    import src.utils.helper_functions as hf
+    return hf.to_pdf_from_sections([(title, [_Entry(*entry) for entry in entries], note) for title, entries, note in sections], file_title).getvalue()
+
+
+def _entries(articles: list) -> list:
+    return [(article.title, article.date, article.link) for article in articles]
+
+
+def _warm_worker():
+    # Pays for the reportlab imports when the pool starts instead of on the first render
+    import src.utils.helper_functions
+    import reportlab.pdfgen.canvas
+    return os.getpid()
+
+
+class RenderService:
+    """
+    Renders article PDFs off the event loop, on a pool of `workers` processes (ReportLab is pure Python and holds
+    the GIL, so only processes scale with cores) or threads ('thread' keeps the loop responsive without extra memory).
+    Documents already rendered are served from the PDF cache, and concurrent requests for the same document share
+    one render. At most `workers + max_queue` renders are accepted at once, beyond that render() raises RenderBusy
+    so callers can tell the user to retry rather than pile up. A render not finished after `timeout` seconds raises TimeoutError;
+    a worker cannot be interrupted, so it keeps its slot until the render actually ends.
+    """
+
+    def __init__(self, executor = RENDER_EXECUTOR, workers = None, max_queue = RENDER_MAX_QUEUE, timeout = RENDER_TIMEOUT_SECONDS):
+        self.executor = executor
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pool = None
+        self._in_flight = 0
+        self._rendering = {}  # document key -> future of the render in progress
+        self._stats = {"rendered": 0, "shared": 0, "rejected": 0, "timeouts": 0, "failures": 0, "render_ms": 0.0, "max_in_flight": 0}
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.executor == 'process':
+                # spawn: forking the running server would copy its event loop, sockets and threads into the workers
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            else:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='render')
+        return self._pool
+
+    async def start(self):
+        """Start every worker ahead of the first render; on failure the pool is dropped and recreated by the next render"""
+        if self.executor == 'inline':
+            return
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        pool = self._get_pool()
+        try:
+            await asyncio.gather(*(loop.run_in_executor(pool, _warm_worker) for _ in range(self.workers)))
+        except Exception as e:
+            # Runs as a startup task nobody awaits, a broken pool must not be left for the first user's render
+            logging.error(f"Render pool failed to start: {e!r}")
+            if self._pool is pool:
+                self.shutdown()
+            return
+        logging.info(f"Render pool: {self.workers} {self.executor} workers started in {time.perf_counter() - started:.2f}s")
+
+    async def render(self, articles: list, file_title: str) -> bytes:
+        """The PDF of `articles` as bytes"""
+        entries = _entries(articles)
+        return await self._render_document(document_key(entries, file_title), _render, entries, file_title)
+
+    async def render_sections(self, sections: list, file_title: str) -> bytes:
+        """The combined PDF of (section title, articles, note) sections, see hf.to_pdf_from_sections"""
+        sections = [(title, _entries(articles), note or '') for title, articles, note in sections]
+        # Each section hashed as a marker row followed by its entries
+        rows = [row for title, entries, note in sections for row in [('\x02section', title, note)] + entries]
+        return await self._render_document(document_key(rows, file_title), _render_sections, sections, file_title)
+
+    async def _render_document(self, key: str, render, document, file_title: str) -> bytes:
+        pdf = await pdf_cache.get(key)
+        if pdf is not None:
+            return pdf
+        if self.executor == 'inline':
+            pdf = render(document, file_title)
+            await pdf_cache.put(key, pdf)
+            return pdf
+
+        future = self._rendering.get(key)
+        if future is None:
+            future = self._submit(key, render, document, file_title)
+        else:
+            self._stats["shared"] += 1
+        try:
+            pdf = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            raise TimeoutError(f"Rendering '{file_title}' took more than {self.timeout}s")
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory), start a fresh pool for the next renders
+            self._stats["failures"] += 1
+            self._pool = None
+            raise
+        except Exception:
+            self._stats["failures"] += 1
+            raise
+        await pdf_cache.put(key, pdf)
+        return pdf
+
+    def _submit(self, key: str, render, document, file_title: str) -> asyncio.Future:
+        if self._in_flight >= self.workers + self.max_queue:
+            self._stats["rejected"] += 1
+            raise RenderBusy(f"{self._in_flight} PDFs are already being rendered")
+        started = time.perf_counter()
+        future = asyncio.get_running_loop().run_in_executor(self._get_pool(), render, document, file_title)
+        self._in_flight += 1
+        self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._in_flight)
+        self._rendering[key] = future
+
+        def finished(future):
+            self._in_flight -= 1
+            self._rendering.pop(key, None)
+            if not future.cancelled() and future.exception() is None:
+                self._stats["rendered"] += 1
+                self._stats["render_ms"] += (time.perf_counter() - started) * 1000
+
+        future.add_done_callback(finished)
+        return future
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self):
+        rendered = self._stats["rendered"]
+        return {**self._stats, "executor": self.executor, "workers": self.workers, "in_flight": self._in_flight,
+                "avg_render_ms": round(self._stats["render_ms"] / rendered, 1) if rendered else None, "cache": pdf_cache.stats()}
+
+
+def service_from_env() -> RenderService:
+    """RENDER_EXECUTOR=process|thread|inline, RENDER_WORKERS (default: one per core), RENDER_MAX_QUEUE, RENDER_TIMEOUT_SECONDS"""
+    executor = os.getenv("RENDER_EXECUTOR", RENDER_EXECUTOR)
+    if executor not in ('process', 'thread', 'inline'):
+        logging.warning(f"Unknown RENDER_EXECUTOR {executor}, using {RENDER_EXECUTOR}")
+        executor = RENDER_EXECUTOR
+    return RenderService(executor, int(os.getenv("RENDER_WORKERS", 0)) or None,
+                         int(os.getenv("RENDER_MAX_QUEUE", RENDER_MAX_QUEUE)), float(os.getenv("RENDER_TIMEOUT_SECONDS", RENDER_TIMEOUT_SECONDS)))
+
+
+render_service = service_from_env()
@@ -0,0 +1,84 @@
+import io
+from email.utils import parsedate_tz, mktime_tz
+from lxml import etree, html
+from src.utils.article import Article
+
+# Channel-level fields kept from the feed, everything else in <channel> is skipped
+FEED_FIELDS = ('title', 'link', 'language', 'lastBuildDate', 'description')
+
+
+def parse_sub_articles(summary):
+    """Return the related articles (url, title, publisher) listed in an entry's summary HTML"""
+    try:
+        root = html.fragment_fromstring(summary, create_parent='div')
+    except Exception:
+        return summary
+    sub_articles = []
+    for li in root.iter('li'):
+        a = li.find('.//a')
+        font = li.find('.//font')
+        if a is None or font is None or a.get('href') is None:
+            continue
+        sub_articles.append({"url": a.get('href'),
+                             "title": a.text_content(),
+                             "publisher": font.text_content()})
+    return sub_articles
+
+
+def parse_published(value):
+    """Parse an RFC 822 pubDate into epoch seconds"""
+    parsed = parsedate_tz(value) if value else None
+    if parsed is None:
+        return None
+    return mktime_tz(parsed)
+
+
+def _article_from_item(item):
+    title, link, publisher, publisher_url, published, summary = '', '', None, None, None, None
+    for child in item:
+        tag = child.tag
+        if tag == 'title':
+            title = child.text or ''
+        elif tag == 'link':
+            link = (child.text or '').strip()
+        elif tag == 'pubDate':
+            published = parse_published(child.text)
+        elif tag == 'description':
+            summary = child.text or ''
+        elif tag == 'source':
+            publisher = child.text
+            publisher_url = child.get('url')
+    if published is None:
+        return None
+    return Article.create(title, link, publisher, published, summary, publisher_url)
+
+
+def parse_feed(content: bytes):
+    """
+    Stream a Google News RSS document and return {'feed': ..., 'entries': [Article, ...]}; items without a usable pubDate are dropped.
+    Each <item> is discarded from the tree as soon as it has been read, so memory stays flat for large feeds.
+    """
+    feed = {}
+    entries = []
+    depth_in_item = 0
+    context = etree.iterparse(io.BytesIO(content), events=('start', 'end'), recover=True, resolve_entities=False, no_network=True)
+    for event, elem in context:
+        tag = elem.tag
+        if event == 'start':
+            if tag == 'item':
+                depth_in_item += 1
+            continue
+        if tag == 'item':
+            depth_in_item -= 1
+            article = _article_from_item(elem)
+            if article is not None:
+                entries.append(article)
+            elem.clear()
+            parent = elem.getparent()
+            while elem.getprevious() is not None:
+                del parent[0]
+        elif not depth_in_item and tag in FEED_FIELDS:
+            parent = elem.getparent()
+            if parent is not None and parent.tag == 'channel':
+                feed[tag] = elem.text
+    return {'feed': feed, 'entries': entries}
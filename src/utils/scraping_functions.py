@@ -1,47 +1,159 @@
+import asyncio
+import heapq
+import time
+from operator import attrgetter
+from typing import Awaitable, Callable, NamedTuple
 from src.pygooglenews import GoogleNews
 from datetime import date
 from datetime import timedelta
+from datetime import datetime, timezone
 from src.models import make_gn_object
+from src.utils.article import Article
+from src.utils.dedupe import collapse_near_duplicates
+from src.utils.article_store import article_store
+from src.utils.date_parsing import normalise_date, when_delta
 import src.utils.helper_functions as hf
+from src.utils.constants import FETCH_MANY_CONCURRENCY, NEAR_DUPLICATE_MIN_SIMILARITY
+from src.utils.coalesce import coalescer, canonical_query, canonical_topic_hash
+# Identical requests from different users (same canonical topic or query, same filters) share one
+# fetch and post-processing pass through the coalescer
+
 # Functions for getting top_news
-def get_top_news(country = 'US'):
+async def get_top_news(country = 'US'):
+  return await coalescer.run(('top', country), lambda: _get_top_news(country))
+
+async def _get_top_news(country):
   GN_object = make_gn_object(country=country)
-  top_news_entries = GN_object.top_news()["entries"]
+  top_news_entries = (await GN_object.top_news())["entries"]
   processed_top_news = news_post_processing(top_news_entries)
   return processed_top_news
 
 # Functions for getting topic_news
-def get_topic_headline_by_topic(topic_hash: str, country_code:str = 'US', filter_num_days = 0):
+async def get_topic_headline_by_topic(topic_hash: str, country_code:str = 'US', filter_num_days = 0):
+  topic_hash = canonical_topic_hash(topic_hash)
+  return await coalescer.run(('topic', topic_hash, country_code, filter_num_days), lambda: _get_topic_headline_by_topic(topic_hash, country_code, filter_num_days))
+
+async def _get_topic_headline_by_topic(topic_hash, country_code, filter_num_days):
   gn_object = make_gn_object(country=country_code)
-  topic_headlines = gn_object.topic_headlines(topic_hash)
+  topic_headlines = await gn_object.topic_headlines(topic_hash)
   topic_headlines = topic_headlines['entries']
-  if filter_num_days > 0:
-    topic_headlines = hf.filter_recent_articles(topic_headlines, filter_num_days)
+  since = hf.recent_cutoff_timestamp(filter_num_days) if filter_num_days > 0 else None
  
-  processed_topic_headlines = news_post_processing(topic_headlines)
+  processed_topic_headlines = news_post_processing(topic_headlines, since=since)
   
   return processed_topic_headlines
 
 # Functions for getting query_news
-def get_news_by_query(query:str, when = None, from_=None, to_= None):
+async def get_news_by_query(query:str, when = None, from_=None, to_= None, local_first = False):
+  # Equivalent spellings share one fetch, but Google is sent the query as the user typed it
+  return await coalescer.run(('query', canonical_query(query), when, from_, to_, local_first), lambda: _get_news_by_query(query.strip(), when, from_, to_, local_first))
+
+async def _get_news_by_query(query, when, from_, to_, local_first = False):
+  if local_first:
+    window = _search_window(when, from_, to_)
+    if window:
+      local_news = await article_store.search_local(query, *window)
+      if local_news is not None:
+        return news_post_processing(local_news)
+
+  searched_range = _past_search_range(when, from_, to_)
+  if searched_range:
+    stored_news = await article_store.covered_range(query, *searched_range)
+    if stored_news is not None:
+      return news_post_processing(stored_news)
+
+  started = time.perf_counter()
   gn = GoogleNews(country="US")
-  query_news = gn.search(query = query, when = when, from_ = from_, to_ = to_)  
+  query_news = await gn.search(query = query, when = when, from_ = from_, to_ = to_)  
+  if searched_range:
+    article_store.record_upstream((time.perf_counter() - started) * 1000)
   
   query_news = query_news['entries']
   processed_query_news = news_post_processing(query_news)
   
   return processed_query_news
 
+def _past_search_range(when, from_, to_):
+  """(from_, to_) as dates when the search is a from_/to_ window that has already ended, None otherwise"""
+  if when or not (from_ and to_):
+    return None
+  try:
+    searched_range = (date.fromisoformat(normalise_date(from_)), date.fromisoformat(normalise_date(to_)))
+  except Exception:
+    return None
+  return searched_range if searched_range[1] < date.today() else None
+
+def _search_window(when, from_, to_):
+  """The [start, end) datetimes a when / from_-to_ search covers, None if it cannot be determined"""
+  now = datetime.now(timezone.utc)
+  if when:
+    if not hf.validate_when_input(when):
+      return None
+    return now - when_delta(when), now
+  try:
+    start = datetime.fromisoformat(normalise_date(from_)).replace(tzinfo=timezone.utc) if from_ else now - timedelta(days=365)
+    end = datetime.fromisoformat(normalise_date(to_)).replace(tzinfo=timezone.utc) if to_ else now
+  except Exception:
+    return None
+  return start, end
+
+# Batch fetching of several feeds at once
+
+class FeedSpec(NamedTuple):
+  label: str
+  fetch: Callable[..., Awaitable[list]]
+  kwargs: dict
+
+def topic_spec(topic_name: str, topic_hash: str, country_code: str = 'US', filter_num_days = 0) -> FeedSpec:
+  return FeedSpec(topic_name, get_topic_headline_by_topic, {'topic_hash': topic_hash, 'country_code': country_code, 'filter_num_days': filter_num_days})
+
+def query_spec(query: str, when = None, from_ = None, to_ = None, local_first = False) -> FeedSpec:
+  return FeedSpec(query, get_news_by_query, {'query': query, 'when': when, 'from_': from_, 'to_': to_, 'local_first': local_first})
+
+async def fetch_many(specs: list[FeedSpec], concurrency = FETCH_MANY_CONCURRENCY):
+  """
+  Fetch and post-process several feeds concurrently, at most `concurrency` at a time.
+  Yields (spec, news, error) in completion order; a failing spec yields its exception instead of aborting the batch.
+  """
+  semaphore = asyncio.Semaphore(concurrency)
+
+  async def run(spec: FeedSpec):
+    async with semaphore:
+      try:
+        return spec, await spec.fetch(**spec.kwargs), None
+      except Exception as e:
+        return spec, None, e
+
+  tasks = [asyncio.ensure_future(run(spec)) for spec in specs]
+  try:
+    for next_done in asyncio.as_completed(tasks):
+      yield await next_done
+  finally:
+    # The consumer stopped early (error or cancellation), do not leave fetches running
+    for task in tasks:
+      task.cancel()
+
 # post-processing pipelines
 
-def news_post_processing(news):
-  # 1. get unique list
-  # 2. sort by date
-  # 3. return title, link, date (timestruct)
-  # 4. parse date into datestring
-  unique_news_entries = hf.get_unique_list(news)
-  sorted_unique_news_entries = hf.sort_by_date(unique_news_entries)
-  news_entries_extracted = list(map(lambda entry: hf.extract_title_link_date(entry), sorted_unique_news_entries))
-  parsed_news_entries = list(map(lambda entry: {'title': entry['title'], 'link': entry['link'], 'date': hf.convert_timestruct_to_datestring(entry['published_parsed'])}, news_entries_extracted))
-  return parsed_news_entries
-  
\ No newline at end of file
+def news_post_processing(news: list[Article], limit = None, since = None, min_similarity = NEAR_DUPLICATE_MIN_SIMILARITY) -> list[Article]:
+  """
+  Return the articles newest first, dropping those published before `since` (epoch seconds) and duplicate
+  stories (same dedupe_key, first occurrence wins) in a single pass. Near-duplicates (re-syndicated or reworded
+  headlines, related coverage) are then collapsed to their most recent article unless `min_similarity` is None.
+  With `limit`, only the newest `limit` articles are selected with a heap instead of sorting everything.
+  """
+  unique_news_entries = {}
+  for article in news:
+    if since is not None and article.published < since:
+      continue
+    if article.dedupe_key not in unique_news_entries:
+      unique_news_entries[article.dedupe_key] = article
+
+  articles = unique_news_entries.values()
+  if min_similarity is not None:
+    articles = collapse_near_duplicates(list(articles), min_similarity)
+
+  by_date = attrgetter('published')
+  if limit is not None:
+    return heapq.nlargest(limit, articles, key=by_date)
+  return sorted(articles, key=by_date, reverse=True)
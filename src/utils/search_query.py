@@ -0,0 +1,149 @@
+import re
+from itertools import product
+from typing import NamedTuple, Optional
+
+# Splits a Google News search into the part Postgres' websearch_to_tsquery understands (words, "phrases", -word, OR)
+# and the site: / intitle: filters that are applied as separate conditions, or into OR-clauses of word phrases
+# that single articles can be checked against in Python (see percolator.py).
+
+# An optionally negated operator with a quoted value, an optionally negated operator, a quoted phrase, or a bare word
+_SEARCH_TOKEN = re.compile(r'-?[a-z]+:"[^"]*"|-?[a-z]+:\S+|-?"[^"]*"|\S+', re.IGNORECASE)
+_OPERATOR = re.compile(r'^(-?)([a-z]+):(.*)$', re.IGNORECASE)
+_WORD = re.compile(r'\w+')
+
+# Handled by the caller's time window
+TIME_OPERATORS = frozenset(('when', 'after', 'before'))
+# Operators (see google_search_help.py) that the local index cannot evaluate, queries using them go upstream
+UNSUPPORTED_OPERATORS = frozenset(('inurl', 'allinurl', 'filetype', 'related', 'cache', 'allintext', 'allintitle', 'define', 'source', 'link', 'inanchor'))
+
+
+class CompiledSearch(NamedTuple):
+    text: str  # for websearch_to_tsquery, may be empty when the query only has filters
+    sites: tuple = ()
+    excluded_sites: tuple = ()
+    titles: tuple = ()  # each value must match the headline alone
+    excluded_titles: tuple = ()
+
+
+def compile_search(query: str) -> Optional[CompiledSearch]:
+    """
+    Compile a search for the local index, None when it uses syntax only Google can evaluate.
+    websearch_to_tsquery ignores parentheses and binds OR looser than AND (`a b OR c` is (a AND b) OR c, where Google
+    reads a AND (b OR c)), so queries with parentheses, or with OR anywhere but between all of their words, go upstream.
+    """
+    text = []
+    filters = {'sites': [], 'excluded_sites': [], 'titles': [], 'excluded_titles': []}
+    for token in _SEARCH_TOKEN.findall(query):
+        if token.startswith('AROUND(') or '*' in token or '..' in token or '(' in token or ')' in token:
+            return None
+        operator = _OPERATOR.match(token) if not token.lstrip('-').startswith('"') else None
+        if operator:
+            negated, name, value = operator.group(1) == '-', operator.group(2).lower(), operator.group(3).strip('"')
+            if name in TIME_OPERATORS:
+                continue
+            if name in UNSUPPORTED_OPERATORS:
+                return None
+            if name == 'site' and value:
+                filters['excluded_sites' if negated else 'sites'].append(value.lower())
+                continue
+            if name == 'intitle' and value:
+                filters['excluded_titles' if negated else 'titles'].append(value)
+                continue
+        if token == '|':
+            token = 'OR'
+        if token == 'AND':
+            continue
+        text.append(token)
+    if not text and not filters['sites'] and not filters['titles']:
+        return None
+    if 'OR' in text and (len(text) % 2 == 0 or any((token == 'OR') != (i % 2 == 1) for i, token in enumerate(text))):
+        return None
+    return CompiledSearch(' '.join(text), *(tuple(values) for values in filters.values()))
+
+
+class QueryClause(NamedTuple):
+    """One OR-alternative of a search: all its phrases must appear in the article, none of the excluded ones"""
+    phrases: tuple = ()  # each a tuple of lowercase words
+    excluded: tuple = ()
+    sites: tuple = ()  # the publisher must be on one of them
+    excluded_sites: tuple = ()
+    titles: tuple = ()  # phrases that must appear in the headline alone
+    excluded_titles: tuple = ()
+
+
+def words(text: str) -> tuple:
+    """Lowercased words, what clause phrases are made of and matched against"""
+    return tuple(_WORD.findall(text.lower()))
+
+
+# A query whose ORs expand to more clauses than this goes upstream instead
+MAX_QUERY_CLAUSES = 64
+_POSITIVE_FIELDS = ('phrases', 'sites', 'titles')
+
+
+def _term(token: str):
+    """(QueryClause field, value) of one search token, None when it adds no condition"""
+    negated = token.startswith('-') and len(token) > 1
+    operator = _OPERATOR.match(token) if not token.lstrip('-').startswith('"') else None
+    if operator:
+        name, value = operator.group(2).lower(), operator.group(3).strip('"')
+        if name in TIME_OPERATORS:
+            return None
+        if name == 'site' and value:
+            return ('excluded_sites' if negated else 'sites'), value.lower().removeprefix('www.')
+        if name == 'intitle' and value:
+            phrase = words(value)
+            return (('excluded_titles' if negated else 'titles'), phrase) if phrase else None
+    phrase = words(token.removeprefix('-') if negated else token)
+    return (('excluded' if negated else 'phrases'), phrase) if phrase else None
+
+
+def compile_clauses(query: str) -> Optional[tuple]:
+    """
+    Compile a search into QueryClauses (alternatives, any of which matching is enough), None when it uses syntax
+    that cannot be checked against a single article, parentheses included.
+    As in Google, OR binds the terms next to it: `science tutor OR math tutor` is science AND (tutor OR math) AND tutor.
+    """
+    groups = []  # terms ANDed together, each a list of ORed alternatives
+    pending_or = False
+    for token in _SEARCH_TOKEN.findall(query):
+        if token.startswith('AROUND(') or '*' in token or '..' in token or '(' in token or ')' in token:
+            return None
+        if token in ('OR', '|'):
+            pending_or = bool(groups)
+            continue
+        if token == 'AND':
+            continue
+        operator = _OPERATOR.match(token) if not token.lstrip('-').startswith('"') else None
+        if operator and operator.group(2).lower() in UNSUPPORTED_OPERATORS:
+            return None
+        term = _term(token)
+        if term is None:
+            continue
+        if pending_or:
+            groups[-1].append(term)
+            pending_or = False
+        else:
+            groups.append([term])
+
+    count = 1
+    for alternatives in groups:
+        if len(alternatives) > 1 and any(field not in _POSITIVE_FIELDS for field, _ in alternatives):
+            return None  # an exclusion ORed with something else
+        count *= len(alternatives)
+    if count > MAX_QUERY_CLAUSES:
+        return None
+    clauses = []
+    for combination in product(*groups):
+        clause = QueryClause._make([] for _ in QueryClause._fields)
+        for field, value in combination:
+            if value not in getattr(clause, field):
+                getattr(clause, field).append(value)
+        if clause.phrases or clause.sites or clause.titles:
+            clauses.append(QueryClause._make(map(tuple, clause)))
+    return tuple(clauses) or None
+
+
+def site_pattern(site: str) -> str:
+    """POSIX regex matching a publisher URL on `site` or one of its subdomains"""
+    return r'^https?://([^/]+\.)?' + re.escape(site.removeprefix('www.')) + r'(:\d+)?(/|$)'
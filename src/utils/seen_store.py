@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import struct
+import time
+from collections import OrderedDict
+from hashlib import blake2b
+from src.database.database import get_db
+import src.database.crud as crud
+from src.utils.article import Article
+from src.utils.constants import SEEN_FILTER_BITS, SEEN_FILTER_HASHES, SEEN_GENERATION_SECONDS, SEEN_GENERATIONS, SEEN_CACHE_USERS, SEEN_FLUSH_SECONDS
+
+# Serialised as: start of the newest generation (epoch seconds), number of generations, bits per generation,
+# then the generations' bit arrays, newest first
+_HEADER = struct.Struct('>dBI')
+
+
+class RotatingBloomFilter:
+    """
+    Approximate set of delivered articles with bounded memory and time-based expiry.
+    Keys go into the newest of `generations` Bloom filters; a new generation is started every `generation_seconds`
+    and the oldest one dropped, so a key is remembered for between (generations - 1) and generations periods.
+    A delivered article is always reported as seen until it expires; false positives (about 1% up to bits / 10 keys
+    per generation) only hide an article that was not delivered yet.
+    """
+
+    def __init__(self, bits = SEEN_FILTER_BITS, hashes = SEEN_FILTER_HASHES, generation_seconds = SEEN_GENERATION_SECONDS, generations = SEEN_GENERATIONS):
+        self.bits = bits
+        self.hashes = hashes
+        self.generation_seconds = generation_seconds
+        self.started_at = time.time()
+        self._generations = [bytearray(bits // 8) for _ in range(generations)]
+
+    def _positions(self, key: str):
+        digest = blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    def rotate(self, now = None):
+        now = time.time() if now is None else now
+        elapsed = int((now - self.started_at) // self.generation_seconds)
+        if elapsed <= 0:
+            return
+        for _ in range(min(elapsed, len(self._generations))):
+            self._generations.pop()
+            self._generations.insert(0, bytearray(self.bits // 8))
+        self.started_at += elapsed * self.generation_seconds
+
+    def add(self, key: str):
+        newest = self._generations[0]
+        for position in self._positions(key):
+            newest[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        positions = self._positions(key)
+        return any(all(generation[position >> 3] & (1 << (position & 7)) for position in positions) for generation in self._generations)
+
+    def to_bytes(self) -> bytes:
+        return _HEADER.pack(self.started_at, len(self._generations), self.bits) + b''.join(self._generations)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "RotatingBloomFilter":
+        if len(data) < _HEADER.size:
+            logging.warning(f"Truncated seen articles filter ({len(data)} bytes), starting a new one")
+            return cls()
+        started_at, generations, bits = _HEADER.unpack_from(data)
+        if bits != SEEN_FILTER_BITS or generations != SEEN_GENERATIONS:
+            # Stored with another configuration, start over rather than misread it
+            return cls()
+        if len(data) != _HEADER.size + generations * (bits // 8):
+            logging.warning(f"Seen articles filter of {len(data)} bytes, expected {_HEADER.size + generations * (bits // 8)}, starting a new one")
+            return cls()
+        bloom = cls(bits=bits, generations=generations)
+        bloom.started_at = started_at
+        size = bits // 8
+        offset = _HEADER.size
+        bloom._generations = [bytearray(data[offset + i * size:offset + (i + 1) * size]) for i in range(generations)]
+        return bloom
+
+
+def _article_keys(article: Article):
+    # The link identifies the article, the dedupe key catches the same headline reached through another link
+    yield article.link
+    if article.dedupe_key:
+        yield "title:" + article.dedupe_key
+
+
+class SeenStore:
+    """
+    Per-user RotatingBloomFilters persisted in the seenArticles table, the most recently used kept in memory.
+    Deliveries only change the filter in memory; changed filters are written back every SEEN_FLUSH_SECONDS,
+    when evicted from memory and on shutdown, so a user receiving several PDFs costs one write.
+    """
+
+    def __init__(self, max_users = SEEN_CACHE_USERS):
+        self.max_users = max_users
+        self._filters = OrderedDict()
+        self._locks = {}
+        self._dirty = set()  # users whose filter changed since it was last written
+        self._evicted = {}  # dirty filters dropped from memory, written by the next flush
+
+    def _lock(self, user_id):
+        return self._locks.setdefault(user_id, asyncio.Lock())
+
+    async def _load(self, user_id) -> RotatingBloomFilter:
+        bloom = self._filters.get(user_id)
+        if bloom is None:
+            # An evicted filter not written yet is newer than the stored one
+            bloom = self._evicted.pop(user_id, None)
+            if bloom is None:
+                async with get_db() as db:
+                    data = await crud.get_seen_articles_bloom(db, user_id)
+                bloom = RotatingBloomFilter.from_bytes(data) if data else RotatingBloomFilter()
+            self._filters[user_id] = bloom
+            while len(self._filters) > self.max_users:
+                evicted, evicted_bloom = self._filters.popitem(last=False)
+                if evicted in self._dirty:
+                    # Written by the flush under the evicted user's own lock, not here under this user's
+                    self._evicted[evicted] = evicted_bloom
+                elif evicted in self._locks and not self._locks[evicted].locked():
+                    del self._locks[evicted]
+        self._filters.move_to_end(user_id)
+        bloom.rotate()
+        return bloom
+
+    async def unseen(self, user_id, articles: list[Article]) -> list[Article]:
+        """The articles not delivered to the user yet"""
+        async with self._lock(user_id):
+            bloom = await self._load(user_id)
+            return [article for article in articles if not any(key in bloom for key in _article_keys(article))]
+
+    async def mark_delivered(self, user_id, articles: list[Article]):
+        if not articles:
+            return
+        async with self._lock(user_id):
+            bloom = await self._load(user_id)
+            for article in articles:
+                for key in _article_keys(article):
+                    if key not in bloom:
+                        bloom.add(key)
+                        self._dirty.add(user_id)
+            if user_id in self._dirty and user_id not in self._filters:
+                # Evicted by another user's load while this one was using it
+                self._evicted[user_id] = bloom
+
+    async def _write(self, user_id, bloom: RotatingBloomFilter) -> bool:
+        try:
+            async with get_db() as db:
+                await crud.upsert_seen_articles_bloom(db, user_id, bloom.to_bytes())
+            return True
+        except Exception as e:
+            logging.error(f"Could not save delivered articles of {user_id}: {e}")
+            return False
+
+    async def flush(self):
+        """Write every filter changed since its last write"""
+        for user_id in list(self._dirty):
+            async with self._lock(user_id):
+                self._dirty.discard(user_id)
+                bloom = self._filters.get(user_id) or self._evicted.pop(user_id, None)
+                if bloom is not None and not await self._write(user_id, bloom):
+                    self._dirty.add(user_id)  # retried on the next flush
+                    if user_id not in self._filters:
+                        self._evicted[user_id] = bloom
+            lock = self._locks.get(user_id)
+            if user_id not in self._filters and user_id not in self._dirty and lock is not None and not lock.locked():
+                del self._locks[user_id]
+
+    async def run_flusher(self):
+        while True:
+            await asyncio.sleep(SEEN_FLUSH_SECONDS)
+            await self.flush()
+
+
+seen_store = SeenStore()
@@ -0,0 +1,51 @@
+import asyncio
+import importlib
+import logging
+import time
+from sqlalchemy import text
+from src.database.database import engine
+from src.pygooglenews import get_http_client
+
+# Modules that are imported lazily on the request path, loaded in the background right after startup
+WARM_UP_MODULES = (
+    'reportlab.pdfgen.canvas',
+    'reportlab.lib.pagesizes',
+    'reportlab.lib.units',
+    'reportlab.lib.colors',
+)
+
+# Each component flips to True once primed, /readyz only answers 200 when all of them are
+readiness = {
+    "database": False,
+    "warm_up": False,
+    "delivery": False,
+    "caches": False,  # feed cache primed by the prefetch scheduler, set straight away when prefetching is disabled
+}
+
+def is_ready() -> bool:
+    return all(readiness.values())
+
+def _import_modules():
+    for module in WARM_UP_MODULES:
+        importlib.import_module(module)
+
+async def warm_up():
+    """Import heavy modules off the event loop and open the shared HTTP client"""
+    started = time.perf_counter()
+    await asyncio.to_thread(_import_modules)
+    get_http_client()
+    readiness["warm_up"] = True
+    logging.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+
+async def prime_database(retries = 5, delay = 2.0):
+    """Open a first pooled connection so the first user does not pay for it"""
+    for attempt in range(retries):
+        try:
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+            readiness["database"] = True
+            return
+        except Exception as e:
+            logging.warning(f"Database not reachable yet (attempt {attempt + 1}/{retries}): {e}")
+            await asyncio.sleep(delay * 2 ** attempt)
+    logging.error("Database still unreachable, /readyz will keep reporting not ready")
@@ -0,0 +1,50 @@
+from src.utils.article import Article
+from src.utils.percolator import Percolator
+from src.utils.search_query import CompiledSearch, compile_clauses, compile_search
+
+
+def _article(title: str) -> Article:
+    return Article.create(f"{title} - Publisher", f"https://example.com/{title.replace(' ', '-')}", "Publisher", 1700000000)
+
+
+def _phrases(clauses) -> set:
+    return {frozenset(' '.join(phrase) for phrase in clause.phrases) for clause in clauses}
+
+
+def test_parentheses_go_upstream():
+    assert compile_clauses("(a OR b) c") is None
+    assert compile_clauses("election (results)") is None
+    assert not Percolator([("user", "(a OR b) c")]).match(_article("a story"))
+
+
+def test_or_binds_adjacent_terms():
+    # The help example: science AND (tutor OR math) AND tutor
+    assert _phrases(compile_clauses("science tutor OR math tutor")) == {frozenset({"science", "tutor"}), frozenset({"science", "math", "tutor"})}
+    assert _phrases(compile_clauses("a b OR c d")) == {frozenset({"a", "b", "d"}), frozenset({"a", "c", "d"})}
+
+    percolator = Percolator([("user", "storm OR flood warning")])
+    assert percolator.match(_article("Flood warning issued"))
+    assert percolator.match(_article("Storm warning for the coast"))
+    assert not percolator.match(_article("Storm hits the coast"))
+
+
+def test_or_of_sites():
+    clauses = compile_clauses("site:bbc.com OR site:cnn.com election")
+    assert {clause.sites for clause in clauses} == {("bbc.com",), ("cnn.com",)}
+    assert all(clause.phrases == (("election",),) for clause in clauses)
+
+
+def test_ored_exclusion_goes_upstream():
+    assert compile_clauses("a OR -b") is None
+    assert compile_clauses("-b") is None
+
+
+def test_local_search_sends_parentheses_upstream():
+    assert compile_search("(a OR b) c") is None
+    assert compile_search("a b c").text == "a b c"
+
+
+def test_local_search_only_keeps_or_between_all_words():
+    assert compile_search("storm OR flood OR fire site:bbc.com") == CompiledSearch("storm OR flood OR fire", sites=("bbc.com",))
+    # websearch_to_tsquery would read (storm AND warning) OR flood
+    assert compile_search("storm warning OR flood") is None